@@ -0,0 +1,174 @@
+import math
+import numpy as np
+from scipy.stats import chi2, norm, kstwo
+from GOFTester import pool_bins
+
+# Incremental goodness-of-fit accumulators. Feed chunks with update(), query
+# at any time, and combine accumulators from different workers with merge().
+
+class ChiSquareAccumulator:
+    # Exact binned counts. With edges, bin i holds edges[i] < x <= edges[i+1]
+    # (the first bin is also closed on the left) as in unif_gof_test; values
+    # outside the edges are not counted. Without edges, data are non-negative
+    # integers counted one bin per value.
+    def __init__(self, edges=None):
+        self.edges = None if edges is None else np.asarray(edges, dtype=np.float64)
+        self.counts = np.zeros(0 if edges is None else len(self.edges) - 1, dtype=np.int64)
+        self.n = 0
+
+    def update(self, data):
+        data = np.asarray(data)
+        if self.edges is None:
+            data = data.astype(np.int64, copy=False)
+            if len(data) and data.min() < 0:
+                raise ValueError("integer counts require non-negative data")
+            counts = np.bincount(data, minlength=len(self.counts))
+            counts[:len(self.counts)] += self.counts
+            self.counts = counts
+        else:
+            k = len(self.counts)
+            bins = np.searchsorted(self.edges, data, side='left') - 1
+            bins[data == self.edges[0]] = 0
+            self.counts += np.bincount(bins[(bins >= 0) & (bins < k)], minlength=k)
+        self.n += len(data)
+        return self
+
+    def merge(self, other):
+        if (self.edges is None) != (other.edges is None) or (self.edges is not None and not np.array_equal(self.edges, other.edges)):
+            raise ValueError("can only merge accumulators with the same bins")
+        if len(other.counts) > len(self.counts):
+            self.counts = np.concatenate([self.counts, np.zeros(len(other.counts) - len(self.counts), dtype=np.int64)])
+        self.counts[:len(other.counts)] += other.counts
+        self.n += other.n
+        return self
+
+    def expected_probs(self, dist):
+        # Bin probabilities under a frozen scipy distribution; in integer mode
+        # the last bin takes the whole upper tail.
+        if self.edges is not None:
+            return np.diff(dist.cdf(self.edges))
+        probs = dist.pmf(np.arange(len(self.counts)))
+        probs[-1] = dist.sf(len(self.counts) - 2)
+        return probs
+
+    def chisquare(self, probs=None, dist=None, ddof=0, min_expected=5):
+        if self.n == 0:
+            raise ValueError("no data: update() the accumulator before testing")
+        if probs is None:
+            probs = self.expected_probs(dist)
+        probs = np.asarray(probs, dtype=np.float64)
+        expected = probs / probs.sum() * self.counts.sum()
+        observed, expected = pool_bins(self.counts, expected, min_expected)
+        chi_2 = float(np.sum((observed - expected) ** 2 / expected))
+        df = len(observed) - 1 - ddof
+        return chi_2, chi2.sf(chi_2, df)
+
+    def test(self, probs=None, dist=None, alpha=0.05, ddof=0, min_expected=5, display=True):
+        chi_2, p_val = self.chisquare(probs=probs, dist=dist, ddof=ddof, min_expected=min_expected)
+        if display:
+            print(f"chi-square statistic: {chi_2}")
+            print(f"p-value: {p_val}")
+            if p_val > alpha:
+                print("ACCEPT null hypothesis: the data follows the expected distribution.")
+            else:
+                print("REJECT null hypothesis: the data does NOT follow the expected distribution.")
+        return p_val > alpha
+
+class SerialCorrelationAccumulator:
+    # Running sums for correlation_test. Chunks must be fed in stream order,
+    # and merge(other) treats other as the continuation of this stream.
+    def __init__(self):
+        self.n = 0
+        self.lag_sum = 0.0
+        self.first = None
+        self.last = None
+
+    def update(self, data):
+        data = np.asarray(data, dtype=np.float64)
+        if len(data) == 0:
+            return self
+        if self.last is not None:
+            self.lag_sum += self.last * data[0]
+        else:
+            self.first = float(data[0])
+        self.lag_sum += float(np.dot(data[:-1], data[1:]))
+        self.last = float(data[-1])
+        self.n += len(data)
+        return self
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.first = other.first
+        else:
+            self.lag_sum += self.last * other.first
+        self.lag_sum += other.lag_sum
+        self.last = other.last
+        self.n += other.n
+        return self
+
+    def test(self, alpha=0.05, display=True):
+        n = self.n
+        if n < 2:
+            raise ValueError("the serial correlation test needs at least 2 values")
+        rho = (12/(n-1))*self.lag_sum - 3
+        rho_est_var = (13*n-19)/(n-1)**2
+        z = rho / math.sqrt(rho_est_var)
+        p = 2 * norm.cdf(-abs(z))
+        z_alpha = norm.ppf(1 - alpha / 2)
+        if display:
+            print("correlation coefficient (rho):", rho)
+            print("z-score:", z)
+            print("p-value:", p)
+            if abs(z) > z_alpha:
+                print("REJECT null hypothesis: low correlation. The correlation is significant.")
+            else:
+                print("ACCEPT null hypothesis: low correlation. The correlation is NOT significant.")
+        return abs(z) > z_alpha
+
+class KSAccumulator:
+    # Kolmogorov-Smirnov test against a fixed continuous cdf with bounded memory.
+    # Data are mapped through the cdf into [0, 1] and counted on a grid of
+    # `bins` equal cells. This is a mergeable quantile sketch in probability
+    # space: the D it reports is exact at the grid points, and the exact KS
+    # statistic lies within 1/bins above it.
+    def __init__(self, cdf, bins=65536):
+        self.cdf = cdf
+        self.bins = bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.n = 0
+
+    def update(self, data):
+        u = np.asarray(self.cdf(np.asarray(data, dtype=np.float64)), dtype=np.float64)
+        cells = np.minimum((u * self.bins).astype(np.int64), self.bins - 1)
+        self.counts += np.bincount(cells, minlength=self.bins)
+        self.n += len(u)
+        return self
+
+    def merge(self, other):
+        if other.bins != self.bins:
+            raise ValueError("can only merge accumulators with the same number of bins")
+        self.counts += other.counts
+        self.n += other.n
+        return self
+
+    def statistic(self):
+        if self.n == 0:
+            raise ValueError("no data: update() the accumulator before testing")
+        grid = np.arange(1, self.bins + 1) / self.bins
+        ecdf = np.cumsum(self.counts) / self.n
+        below = np.concatenate([[0.0], ecdf[:-1]])
+        return float(max(np.max(ecdf - grid), np.max(grid - 1 / self.bins - below), 0.0))
+
+    def test(self, alpha=0.05, display=True):
+        d = self.statistic()
+        p_value = kstwo.sf(d, self.n)
+        if display:
+            print(f"Kolmogorov-Smirnov test statistic: {d} (within {1 / self.bins})")
+            print(f"p-value: {p_value}")
+            if p_value > alpha:
+                print("ACCEPT null hypothesis: the data follows the expected distribution.")
+            else:
+                print("REJECT null hypothesis: the data does NOT follow the expected distribution.")
+        return p_value > alpha
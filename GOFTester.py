@@ -1,20 +1,87 @@
 import PDGenerator as pdg
+import Instrumentation
+import hashlib
+import sys
 import math
+from collections import OrderedDict, namedtuple
 import numpy as np
 import scipy
 import scipy.stats as stats
-from scipy.stats import chi2, norm, normaltest, kstest, expon, triang, uniform, chisquare, gamma, erlang, lognorm, ttest_1samp, nbinom
-
-def unif_gof_test(data, k=10, alpha=0.05, display=True):
-    E = len(data)/k
-    intervals = [i/k for i in range(k+1)]
-    O = [0]*k
-    for i in range(k):
-        if i == 0:
-            O[0] = len([j for j in data if intervals[0] <= j <= intervals[1]])
+from scipy.stats import chi2, norm, normaltest, kstest, expon, triang, uniform, chisquare, gamma, erlang, lognorm, ttest_1samp, nbinom, poisson, kstwo
+
+def pool_bins(observed, expected, min_expected=5):
+    # Merge adjacent bins left to right until each has an expected count of at
+    # least min_expected; a short remainder at the end joins the last bin.
+    # observed may be (R, k) with one row of counts per sample.
+    observed = np.asarray(observed)
+    expected = np.asarray(expected, dtype=np.float64)
+    edges = [0]
+    total = 0.0
+    for i, e in enumerate(expected.tolist()):
+        total += e
+        if total >= min_expected:
+            edges.append(i + 1)
+            total = 0.0
+    if edges[-1] != len(expected):
+        if len(edges) > 1:
+            edges[-1] = len(expected)
         else:
-            O[i] = len([j for j in data if intervals[i] < j <= intervals[i+1]])
-    chi_2 = sum([((O[i]-E)**2)/E for i in range(k)])
+            edges.append(len(expected))
+    return np.add.reduceat(observed, edges[:-1], axis=-1), np.add.reduceat(expected, edges[:-1])
+
+# Fitted parameters of erlang/chi2/lognorm tests, keyed by a hash of the data,
+# so re-testing the same sample (e.g. under several alphas) skips the
+# optimizer. Entries are a few hundred bytes; FIT_CACHE_SIZE bounds their number.
+FIT_CACHE_SIZE = 1024
+fit_cache = OrderedDict()
+fit_cache_stats = {"hits": 0, "misses": 0}
+
+def clear_fit_cache():
+    fit_cache.clear()
+    fit_cache_stats["hits"] = fit_cache_stats["misses"] = 0
+
+def fit_start(dist, data, args):
+    # Method-of-moments starting point (shape args, loc/scale) for dist.fit;
+    # the optimizer's own default is used where none applies.
+    if dist.name == "gamma" and not args:
+        mean, std = data.mean(), data.std()
+        skewness = np.mean((data - mean) ** 3) / std ** 3 if std > 0 else 0.0
+        if skewness > 0:
+            shape = 4 / skewness ** 2
+            scale = std * skewness / 2
+            return (shape,), {"loc": mean - shape * scale, "scale": scale}
+    if dist.name == "lognorm" and not args and len(data) and data.min() > 0:
+        log_data = np.log(data)
+        return (log_data.std(),), {"loc": 0.0, "scale": math.exp(log_data.mean())}
+    return args, {}
+
+def cached_fit(dist, data, *args):
+    # Memoized dist.fit(data, *args).
+    data = np.ascontiguousarray(data, dtype=np.float64)
+    key = (dist.name, args, data.shape, hashlib.blake2b(data, digest_size=16).digest())
+    params = fit_cache.get(key)
+    if params is not None:
+        fit_cache.move_to_end(key)
+        fit_cache_stats["hits"] += 1
+        return params
+    fit_cache_stats["misses"] += 1
+    start, kwds = fit_start(dist, data, args)
+    params = tuple(float(v) for v in dist.fit(data, *start, **kwds))
+    if FIT_CACHE_SIZE > 0:
+        fit_cache[key] = params
+        while len(fit_cache) > FIT_CACHE_SIZE:
+            fit_cache.popitem(last=False)
+    return params
+
+def unif_gof_test(data, k=10, alpha=0.05, display=True, return_counts=False):
+    data = np.asarray(data, dtype=np.float64)
+    E = len(data)/k
+    intervals = np.array([i/k for i in range(k+1)])
+    # Bin i holds intervals[i] < x <= intervals[i+1]; the first bin is also closed on the left.
+    bins = np.searchsorted(intervals, data, side='left') - 1
+    bins[data == intervals[0]] = 0
+    O = np.bincount(bins[(bins >= 0) & (bins < k)], minlength=k)
+    chi_2 = float(np.sum((O-E)**2/E))
     chi_2_alpha = chi2.ppf(q=1-alpha, df=k-1)
     p_value = 1 - chi2.cdf(x=chi_2, df=k-1)
     if display:
@@ -24,10 +91,13 @@ def unif_gof_test(data, k=10, alpha=0.05, display=True):
             print("ACCEPT null hypothesis: the data follows a Uniformly distribution.")
         else:
             print("REJECT null hypothesis: the data does NOT follows a Uniformly distribution.")
+    if return_counts:
+        return chi_2 < chi_2_alpha, O
     return chi_2 < chi_2_alpha
 
 def disc_uniform_gof_test(data, alpha=0.05, display=True):
-    num_bins = len(set(data))
+    data = np.asarray(data)
+    num_bins = len(np.unique(data))
     observed, _ = np.histogram(data, bins=num_bins)
     expected = np.ones(num_bins) * (len(data) / num_bins)
     _, p_value = chisquare(observed, expected)
@@ -40,6 +110,7 @@ def disc_uniform_gof_test(data, alpha=0.05, display=True):
     return p_value > alpha
 
 def tria_gof_test(data, alpha=0.05, a=None, b=None, c=None, display=True):
+    data = np.asarray(data, dtype=np.float64)
     if a is None:
         a = np.min(data)
     if b is None:
@@ -57,8 +128,9 @@ def tria_gof_test(data, alpha=0.05, a=None, b=None, c=None, display=True):
     return p_value > alpha
 
 def expo_gof_test(data, alpha=0.05, lamb=None, display=True):
+    data = np.asarray(data, dtype=np.float64)
     if lamb is None:
-        lamb = 1 / (sum(data) / len(data))
+        lamb = 1 / np.mean(data)
     k2, p_value = kstest(data, expon(scale=1 / lamb).cdf)
     if display:
         print(f"Kolmogorov-Smirnov test statistic: {k2}")
@@ -82,7 +154,7 @@ def weibull_gof_test(data, alpha=0.05, beta=1, lamb=1, display=True):
 
 def erlang_gof_test(data, alpha=0.05, display=True):
     # Fit the Erlang distribution to the data using MLE
-    fit_params = gamma.fit(data)
+    fit_params = cached_fit(gamma, data)
     # Compute the KS test statistic and p-value
     ks_stat, p_val = kstest(data, 'gamma', fit_params)
     # Print the results
@@ -110,7 +182,7 @@ def norm_gof_test(data, alpha=0.05, display=True):
 
 def chi2_gof_test(data, alpha=0.05, m=2, display=True):
     df = m
-    fit_params = chi2.fit(data, df)
+    fit_params = cached_fit(chi2, data, df)
     ks_stat, p_val = kstest(data, 'chi2', fit_params)
     # Print the results
     if display:
@@ -124,7 +196,7 @@ def chi2_gof_test(data, alpha=0.05, m=2, display=True):
 
 def lognorm_gof_test(data, alpha=0.05, display=True):
     # Fit the lognormal distribution to the data using MLE
-    fit_params = lognorm.fit(data)
+    fit_params = cached_fit(lognorm, data)
     # Compute the KS test statistic and p-value
     ks_stat, p_val = kstest(data, 'lognorm', fit_params)
     # Print the results
@@ -150,9 +222,11 @@ def t_gof_test(data, alpha=0.05, display=True):
     return p_val > alpha
 
 def bern_gof_test(data, p=0.5, alpha = 0.05, display=True):
+    data = np.asarray(data)
     n = len(data)
+    ones = np.sum(data)
     expected_counts = [p*n, (1-p)*n]
-    observed_counts = [sum(data), n-sum(data)]
+    observed_counts = [ones, n-ones]
     _, p_val = chisquare(observed_counts, f_exp=expected_counts)
     if display:
         print("p-value: ", p_val)
@@ -165,7 +239,8 @@ def bern_gof_test(data, p=0.5, alpha = 0.05, display=True):
 def bino_gof_test(data, m=2, p=0.5, alpha=0.05, display=True):
     n = len(data)
     expected_counts = [scipy.special.comb(m, k) * p**k * (1-p)**(m-k) * n for k in range(m+1)]
-    observed_counts = [data.count(k) for k in range(m+1)]
+    data = np.asarray(data, dtype=np.int64)
+    observed_counts = np.bincount(data[(data >= 0) & (data <= m)], minlength=m+1)
     _, p_val = chisquare(observed_counts, f_exp=expected_counts)
     if display:
         print("p-value: ", p_val)
@@ -175,12 +250,16 @@ def bino_gof_test(data, m=2, p=0.5, alpha=0.05, display=True):
             print("REJECT null hypothesis: the data does NOT follow a Binomial distribution.")
     return p_val > alpha
 
-def geom_gof_test(data, p=0.5, alpha=0.05, display=True):
-    data = np.array(data)
+def geom_gof_test(data, p=0.5, alpha=0.05, min_expected=5, display=True):
+    data = np.asarray(data, dtype=np.int64)
     n = len(data)
-    expected_counts = np.array([p * (1 - p) ** (k - 1) * n for k in range(1, n + 1)])
-    expected_counts += 1e-10  # add a small constant to avoid zero values
-    observed_counts, _ = np.histogram(data, bins=np.arange(1, n + 2))
+    # Bins k = 1..max(data); the last one takes the whole tail P(X >= max(data)).
+    k_max = max(int(data.max()), 2)
+    k = np.arange(1, k_max + 1)
+    expected_counts = n * p * (1 - p) ** (k - 1)
+    expected_counts[-1] = n * (1 - p) ** (k_max - 1)
+    observed_counts = np.bincount(data[data >= 1] - 1, minlength=k_max)
+    observed_counts, expected_counts = pool_bins(observed_counts, expected_counts, min_expected)
     _, p_val = chisquare(observed_counts, f_exp=expected_counts)
     if display:
         print("p-value: ", p_val)
@@ -242,26 +321,15 @@ def negbin_ks_test(data, m=2, p=0.5, alpha=0.05, display=True):
     return p_val > alpha
 '''
 
-def pois_gof_test(data, lamb=1, alpha=0.05, display=True):
-    def pois_pmf(n=0, lamb=1):
-        pmf = 1
-        for i in range(1, n + 1):
-            pmf *= lamb / i
-        pmf *= math.exp(-lamb)
-        return pmf
-
+def pois_gof_test(data, lamb=1, alpha=0.05, min_expected=5, display=True):
+    data = np.asarray(data, dtype=np.int64)
     n = len(data)
-    # Calculate expected counts for each bin
-    expected_counts = [n * pois_pmf(n=i, lamb=lamb) for i in range(n)]
-    # Combine the last bin with the second-to-last bin to ensure enough observations in each bin
-    expected_counts[-2] += expected_counts[-1]
-    expected_counts = expected_counts[:-1]
-    # Add a small constant value to all expected counts to avoid dividing by zero
-    expected_counts = [count + 1e-10 for count in expected_counts]
-    # Calculate observed counts for each bin
-    observed_counts, _ = np.histogram(data, bins=len(expected_counts), range=(0, len(expected_counts)))
-    # Combine the last bin with the second-to-last bin in the observed counts
-    observed_counts[-2] += observed_counts[-1]
+    # Bins k = 0..max(data); the last one takes the whole tail P(X >= max(data)).
+    k_max = max(int(data.max()), 1)
+    expected_counts = n * poisson.pmf(np.arange(k_max + 1), lamb)
+    expected_counts[-1] = n * poisson.sf(k_max - 1, lamb)
+    observed_counts = np.bincount(data[data >= 0], minlength=k_max + 1)
+    observed_counts, expected_counts = pool_bins(observed_counts, expected_counts, min_expected)
     # Perform chi-squared test for goodness-of-fit
     _, p_val = chisquare(observed_counts, f_exp=expected_counts, ddof=0)
     if display:
@@ -273,7 +341,8 @@ def pois_gof_test(data, lamb=1, alpha=0.05, display=True):
     return p_val > alpha
 
 def correlation_test(data, alpha = 0.05, display=True):
-    rho = (12/(len(data)-1))*sum([data[k]*data[k+1] for k in range(len(data)-1)]) - 3
+    data = np.asarray(data, dtype=np.float64)
+    rho = (12/(len(data)-1))*np.dot(data[:-1], data[1:]) - 3
     rho_est_var = (13*len(data)-19)/(len(data)-1)**2
     z = rho/ math.sqrt(rho_est_var)
     p = 2 * norm.cdf(-abs(z))
@@ -290,6 +359,155 @@ def correlation_test(data, alpha = 0.05, display=True):
             print("ACCEPT null hypothesis: low correlation. The correlation is NOT significant.")
     return abs(z) > z_alpha
 
+# Batched tests: data is an (R, n) matrix holding R samples of size n, one per
+# row. Each returns the R statistics and p-values, which rows the matching
+# single-sample test accepts, and the acceptance rate. geom and pois are the
+# exception: they pool bins over the whole matrix, so a row's decision can
+# differ from the single-sample test, which pools over that row alone.
+BatchResult = namedtuple("BatchResult", ["statistic", "pvalue", "accepted", "acceptance_rate"])
+
+def batch_result(statistic, pvalue, accepted):
+    return BatchResult(statistic, pvalue, accepted, float(np.mean(accepted)))
+
+def as_batch(data, dtype=np.float64):
+    data = np.asarray(data, dtype=dtype)
+    if data.ndim != 2:
+        raise ValueError("data must be an (R, n) matrix")
+    return data
+
+def ks_batch(data, cdf, alpha):
+    # Two-sided KS distance of every row against cdf, which is called on the
+    # row-sorted matrix and must broadcast any per-row parameters as (R, 1).
+    n = data.shape[1]
+    u = cdf(np.sort(data, axis=1))
+    i = np.arange(1, n + 1)
+    d = np.maximum(np.max(i / n - u, axis=1), np.max(u - (i - 1) / n, axis=1))
+    pvalue = kstwo.sf(d, n)
+    return batch_result(d, pvalue, pvalue > alpha)
+
+def chisquare_batch(observed, expected, alpha, ddof=0):
+    statistic = np.sum((observed - expected) ** 2 / expected, axis=1)
+    pvalue = chi2.sf(statistic, observed.shape[1] - 1 - ddof)
+    return batch_result(statistic, pvalue, pvalue > alpha)
+
+def bincount_batch(bins, k):
+    # (R, k) counts of each row of bins; values outside [0, k) are dropped.
+    R = bins.shape[0]
+    bins = np.where((bins >= 0) & (bins < k), bins, k)
+    counts = np.bincount((bins + (k + 1) * np.arange(R)[:, None]).ravel(), minlength=R * (k + 1))
+    return counts.reshape(R, k + 1)[:, :k]
+
+def column(values):
+    return np.asarray(values, dtype=np.float64).reshape(-1, 1)
+
+def unif_gof_test_batch(data, k=10, alpha=0.05):
+    data = as_batch(data)
+    intervals = np.array([i/k for i in range(k+1)])
+    bins = np.searchsorted(intervals, data, side='left') - 1
+    bins[data == intervals[0]] = 0
+    E = data.shape[1] / k
+    O = bincount_batch(bins, k)
+    statistic = np.sum((O - E) ** 2 / E, axis=1)
+    pvalue = chi2.sf(statistic, k - 1)
+    return batch_result(statistic, pvalue, statistic < chi2.ppf(q=1-alpha, df=k-1))
+
+def disc_uniform_gof_test_batch(data, alpha=0.05):
+    # The bins depend on each row's distinct values, so rows are binned one at
+    # a time exactly as disc_uniform_gof_test bins them.
+    data = as_batch(data)
+    statistic = np.empty(len(data))
+    pvalue = np.empty(len(data))
+    for i, row in enumerate(data):
+        num_bins = len(np.unique(row))
+        observed, _ = np.histogram(row, bins=num_bins)
+        statistic[i], pvalue[i] = chisquare(observed, np.ones(num_bins) * (len(row) / num_bins))
+    return batch_result(statistic, pvalue, pvalue > alpha)
+
+def tria_gof_test_batch(data, alpha=0.05, a=None, b=None, c=None):
+    data = as_batch(data)
+    a = column(np.min(data, axis=1) if a is None else a)
+    b = column(np.max(data, axis=1) if b is None else b)
+    c = column(np.median(data, axis=1) if c is None else c)
+    return ks_batch(data, triang(c=(c-a)/(b-a), loc=a, scale=b-a).cdf, alpha)
+
+def expo_gof_test_batch(data, alpha=0.05, lamb=None):
+    data = as_batch(data)
+    lamb = column(1 / np.mean(data, axis=1) if lamb is None else lamb)
+    return ks_batch(data, expon(scale=1 / lamb).cdf, alpha)
+
+def weibull_gof_test_batch(data, alpha=0.05, beta=1, lamb=1):
+    return ks_batch(as_batch(data), stats.weibull_min(c=beta, scale=1/lamb).cdf, alpha)
+
+def fitted_ks_batch(data, dist, alpha, *args):
+    # KS against dist fitted to every row; the fits go through cached_fit.
+    data = as_batch(data)
+    params = np.array([cached_fit(dist, row, *args) for row in data])
+    return ks_batch(data, lambda x: dist.cdf(x, *(params[:, j:j + 1] for j in range(params.shape[1]))), alpha)
+
+def erlang_gof_test_batch(data, alpha=0.05):
+    return fitted_ks_batch(data, gamma, alpha)
+
+def chi2_gof_test_batch(data, alpha=0.05, m=2):
+    return fitted_ks_batch(data, chi2, alpha, m)
+
+def lognorm_gof_test_batch(data, alpha=0.05):
+    return fitted_ks_batch(data, lognorm, alpha)
+
+def norm_gof_test_batch(data, alpha=0.05):
+    statistic, pvalue = normaltest(as_batch(data), axis=1)
+    return batch_result(statistic, pvalue, pvalue > alpha)
+
+def t_gof_test_batch(data, alpha=0.05):
+    statistic, pvalue = ttest_1samp(as_batch(data), popmean=0, axis=1)
+    return batch_result(statistic, pvalue, pvalue > alpha)
+
+def bern_gof_test_batch(data, p=0.5, alpha=0.05):
+    data = as_batch(data, np.int64)
+    n = data.shape[1]
+    ones = np.sum(data, axis=1)
+    return chisquare_batch(np.stack([ones, n - ones], axis=1), np.array([p*n, (1-p)*n]), alpha)
+
+def bino_gof_test_batch(data, m=2, p=0.5, alpha=0.05):
+    data = as_batch(data, np.int64)
+    n = data.shape[1]
+    expected_counts = np.array([scipy.special.comb(m, k) * p**k * (1-p)**(m-k) * n for k in range(m+1)])
+    return chisquare_batch(bincount_batch(data, m + 1), expected_counts, alpha)
+
+# The discrete tests below share one set of bins across rows, up to the
+# largest value in the whole matrix, so bins are pooled once for all rows.
+
+def geom_gof_test_batch(data, p=0.5, alpha=0.05, min_expected=5):
+    data = as_batch(data, np.int64)
+    n = data.shape[1]
+    k_max = max(int(data.max()), 2)
+    k = np.arange(1, k_max + 1)
+    expected_counts = n * p * (1 - p) ** (k - 1)
+    expected_counts[-1] = n * (1 - p) ** (k_max - 1)
+    observed_counts, expected_counts = pool_bins(bincount_batch(data - 1, k_max), expected_counts, min_expected)
+    return chisquare_batch(observed_counts, expected_counts, alpha)
+
+def pois_gof_test_batch(data, lamb=1, alpha=0.05, min_expected=5):
+    data = as_batch(data, np.int64)
+    n = data.shape[1]
+    k_max = max(int(data.max()), 1)
+    expected_counts = n * poisson.pmf(np.arange(k_max + 1), lamb)
+    expected_counts[-1] = n * poisson.sf(k_max - 1, lamb)
+    observed_counts, expected_counts = pool_bins(bincount_batch(data, k_max + 1), expected_counts, min_expected)
+    return chisquare_batch(observed_counts, expected_counts, alpha)
+
+def correlation_test_batch(data, alpha=0.05):
+    # accepted is "correlation NOT significant", the negation of what
+    # correlation_test returns.
+    data = as_batch(data)
+    n = data.shape[1]
+    rho = (12/(n-1))*np.einsum('ij,ij->i', data[:, :-1], data[:, 1:]) - 3
+    z = rho / math.sqrt((13*n-19)/(n-1)**2)
+    pvalue = 2 * norm.cdf(-np.abs(z))
+    return batch_result(z, pvalue, np.abs(z) <= norm.ppf(1 - alpha / 2))
+
+Instrumentation.register(sys.modules[__name__], [name for name in list(globals())
+                         if name.endswith(("_gof_test", "_gof_test_batch", "correlation_test", "correlation_test_batch"))], "test")
+
 if __name__ == '__main__':
 
     print("Single test with 10000 obs")
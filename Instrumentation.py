@@ -0,0 +1,101 @@
+import functools
+import json
+import time
+import numpy as np
+
+# Per-method counters for PDGenerator and GOFTester. Nothing is wrapped until
+# enable(): the registered methods are then swapped for counting wrappers and
+# disable() puts the originals back, so switched off there is no overhead at
+# all. Counts are inclusive: a list method that calls its _array twin is
+# charged for the nested call as well.
+
+enabled = False
+stats = {}
+totals = {"uniforms": 0, "rejections": 0}
+targets = []
+originals = {}
+
+def size(values):
+    return values.size if isinstance(values, np.ndarray) else len(values)
+
+def entry(label):
+    if label not in stats:
+        stats[label] = {"calls": 0, "variates": 0, "uniforms": 0, "rejections": 0, "seconds": 0.0}
+    return stats[label]
+
+def timed(label, func, kind):
+    # kind "generator" counts the values returned, "test" the values tested.
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        uniforms, rejections = totals["uniforms"], totals["rejections"]
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        record = entry(label)
+        record["calls"] += 1
+        if kind == "generator":
+            record["variates"] += size(result)
+        else:
+            record["variates"] += size(args[0] if args else kwargs["data"])
+        record["uniforms"] += totals["uniforms"] - uniforms
+        record["rejections"] += totals["rejections"] - rejections
+        record["seconds"] += seconds
+        return result
+    return wrapper
+
+def counted(func):
+    # Engine methods: every value they return is one uniform consumed.
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result = func(*args, **kwargs)
+        totals["uniforms"] += 1 if isinstance(result, float) else len(result)
+        return result
+    return wrapper
+
+def rejected(k):
+    # Called from rejection loops, only while enabled.
+    totals["rejections"] += int(k)
+
+def patch(owner, name, kind):
+    func = vars(owner)[name]
+    originals[(owner, name)] = func
+    if kind == "engine":
+        setattr(owner, name, counted(func))
+    else:
+        setattr(owner, name, timed(f"{owner.__name__}.{name}", func, kind))
+
+def register(owner, names, kind):
+    # owner is a class or module; kind is "generator", "test" or "engine".
+    for name in names:
+        targets.append((owner, name, kind))
+        if enabled:
+            patch(owner, name, kind)
+
+def enable():
+    global enabled
+    if not enabled:
+        enabled = True
+        for owner, name, kind in targets:
+            patch(owner, name, kind)
+
+def disable():
+    global enabled
+    if enabled:
+        enabled = False
+        for (owner, name), func in originals.items():
+            setattr(owner, name, func)
+        originals.clear()
+
+def reset():
+    stats.clear()
+    totals["uniforms"] = totals["rejections"] = 0
+
+def snapshot():
+    return {label: dict(record) for label, record in stats.items()}
+
+def export_json(path=None):
+    text = json.dumps(snapshot(), indent=1, sort_keys=True)
+    if path is not None:
+        with open(path, "w") as f:
+            f.write(text)
+    return text
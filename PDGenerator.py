@@ -1,37 +1,677 @@
+import base64
+import functools
+import bisect
+import hashlib
+import json
 import math
+import queue
+import struct
+import threading
+import time
+from array import array
+import numpy as np
+import Instrumentation
 
 class MersenneTwister:
+    __slots__ = ("MT", "index")
+
     def __init__(self, seed):
+        self.init_genrand(seed)
+
+    def init_genrand(self, seed):
         self.index = 0
-        self.MT = [0] * 624
-        self.MT[0] = seed
+        MT = [seed]
+        y = seed
         for i in range(1, 624):
-            self.MT[i] = (1812433253 * (self.MT[i - 1] ^ (self.MT[i - 1] >> 30)) + i) & 0xFFFFFFFF
+            y = (1812433253 * (y ^ (y >> 30)) + i) & 0xFFFFFFFF
+            MT.append(y)
+        # MT[0] is only ever read through the 0x80000000 mask, so storing it
+        # truncated to 32 bits keeps the stream identical for any int seed.
+        MT[0] = seed & 0xFFFFFFFF
+        self.MT = array("I", MT)
+
+    def init_by_array(self, init_key):
+        # Reference MT19937 init_by_array (Matsumoto & Nishimura, 2002).
+        self.init_genrand(19650218)
+        MT = self.MT
+        i, j = 1, 0
+        for _ in range(max(624, len(init_key))):
+            MT[i] = ((MT[i] ^ ((MT[i - 1] ^ (MT[i - 1] >> 30)) * 1664525)) + init_key[j] + j) & 0xFFFFFFFF
+            i += 1
+            j += 1
+            if i >= 624:
+                MT[0] = MT[623]
+                i = 1
+            if j >= len(init_key):
+                j = 0
+        for _ in range(623):
+            MT[i] = ((MT[i] ^ ((MT[i - 1] ^ (MT[i - 1] >> 30)) * 1566083941)) - i) & 0xFFFFFFFF
+            i += 1
+            if i >= 624:
+                MT[0] = MT[623]
+                i = 1
+        MT[0] = 0x80000000
 
     def generate_numbers(self):
+        MT = self.MT
         for i in range(624):
-            y = (self.MT[i] & 0x80000000) + (self.MT[(i + 1) % 624] & 0x7FFFFFFF)
-            self.MT[i] = self.MT[(i + 397) % 624] ^ (y >> 1)
-            if y % 2 != 0:
-                self.MT[i] ^= 2567483615
+            y = (MT[i] & 0x80000000) + (MT[(i + 1) % 624] & 0x7FFFFFFF)
+            if y & 1:
+                MT[i] = MT[(i + 397) % 624] ^ (y >> 1) ^ 2567483615
+            else:
+                MT[i] = MT[(i + 397) % 624] ^ (y >> 1)
 
     def extract_number(self):
-        if self.index == 0:
+        index = self.index
+        if index == 0:
             self.generate_numbers()
-        y = self.MT[self.index]
+        y = self.MT[index]
         y ^= (y >> 11)
         y ^= ((y << 7) & 0x9D2C5680)
         y ^= ((y << 15) & 0xEFC60000)
         y ^= (y >> 18)
-        self.index = (self.index + 1) % 624
+        self.index = (index + 1) % 624
         return y / 0xFFFFFFFF # Divided 2^32 - 1
+
+class MersenneTwisterNP:
+    # Same stream as MersenneTwister, but the 624-word state lives in a uint32
+    # array and is regenerated a whole block at a time. After each twist the
+    # block is tempered and scaled once into _uniforms, and every draw until
+    # the next twist copies from that cache.
+    __slots__ = ("MT", "index", "_uniforms")
+    N = 624
+    M = 397
+
+    def __init__(self, seed=None):
+        self._uniforms = None
+        if seed is not None:
+            self.init_genrand(seed)
+
+    def init_genrand(self, seed):
+        self.index = 0
+        self.MT = np.array(MersenneTwister(seed).MT, dtype=np.uint32)
+
+    def init_by_array(self, init_key):
+        mt = MersenneTwister(19650218)
+        mt.init_by_array(init_key)
+        self.index = 0
+        self.MT = np.array(mt.MT, dtype=np.uint32)
+
+    def generate_numbers(self):
+        MT, N, M = self.MT, self.N, self.M
+        # MT[i] depends on MT[i - 227] once i >= 227, so twist in chunks of 227 words.
+        for start in range(0, N - 1, N - M):
+            stop = min(start + N - M, N - 1)
+            y = (MT[start:stop] & 0x80000000) | (MT[start + 1:stop + 1] & 0x7FFFFFFF)
+            if start == 0:
+                src = MT[M:M + stop]
+            else:
+                src = MT[start - (N - M):stop - (N - M)]
+            MT[start:stop] = src ^ (y >> 1) ^ ((y & 1) * np.uint32(2567483615))
+        y = (int(MT[N - 1]) & 0x80000000) | (int(MT[0]) & 0x7FFFFFFF)
+        MT[N - 1] = int(MT[M - 1]) ^ (y >> 1) ^ (2567483615 if y & 1 else 0)
+
+    def get_state(self):
+        # numpy's MT19937 layout: `pos` is the next word to temper and 624
+        # means a twist is due, which is what index 0 means here.
+        return {"bit_generator": "MT19937",
+                "state": {"key": self.MT.copy(), "pos": self.index or self.N}}
+
+    def set_state(self, state):
+        if state.get("bit_generator", "MT19937") != "MT19937":
+            raise ValueError("state is not an MT19937 state")
+        key = np.asarray(state["state"]["key"])
+        pos = int(state["state"]["pos"])
+        if key.shape != (self.N,):
+            raise ValueError(f"key must hold {self.N} words")
+        if not 1 <= pos <= self.N:
+            raise ValueError(f"pos must be in [1, {self.N}]")
+        self.MT = key.astype(np.uint32)
+        self.index = pos % self.N
+        if self.index:
+            self._temper_block()
+
+    def to_bytes(self):
+        # 624 little-endian uint32 words followed by pos, 2500 bytes.
+        return self.MT.astype("<u4").tobytes() + struct.pack("<I", self.index or self.N)
+
+    @classmethod
+    def from_state(cls, key, pos=624):
+        engine = cls()
+        engine.set_state({"state": {"key": key, "pos": pos}})
+        return engine
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) != 4 * (cls.N + 1):
+            raise ValueError(f"state must be {4 * (cls.N + 1)} bytes")
+        return cls.from_state(np.frombuffer(data, dtype="<u4", count=cls.N),
+                              struct.unpack_from("<I", data, 4 * cls.N)[0])
+
+    def skip(self, k):
+        # Discard k outputs: only the blocks they span are twisted, and only
+        # the block the next draw comes from is tempered.
+        if k < 0:
+            raise ValueError("k must be non-negative")
+        pos = (self.index or self.N) + k
+        twisted = False
+        while pos > self.N:
+            self.generate_numbers()
+            pos -= self.N
+            twisted = True
+        self.index = pos % self.N
+        if twisted and self.index:
+            self._temper_block()
+
+    @staticmethod
+    def temper(y):
+        y ^= (y >> 11)
+        y ^= ((y << 7) & np.uint32(0x9D2C5680))
+        y ^= ((y << 15) & np.uint32(0xEFC60000))
+        y ^= (y >> 18)
+        return y
+
+    def _temper_block(self):
+        if self._uniforms is None:
+            self._uniforms = np.empty(self.N, dtype=np.float64)
+        np.divide(self.temper(self.MT.copy()), 0xFFFFFFFF, out=self._uniforms)
+
+    def _next_block(self):
+        self.generate_numbers()
+        self._temper_block()
+
+    def extract_number(self):
+        index = self.index
+        if index == 0:
+            self._next_block()
+        self.index = index + 1 if index < 623 else 0
+        return self._uniforms.item(index)
+
+    def _raw_blocks(self, out):
+        # Bulk path for whole blocks: twist straight into out (a multiple of
+        # N words) and temper it in one pass. The cache is left alone, since
+        # index stays 0 and the next draw twists anyway.
+        for start in range(0, len(out), self.N):
+            self.generate_numbers()
+            out[start:start + self.N] = self.MT
+        return self.temper(out)
+
+    def _draw(self, out, convert):
+        # Fill out from the cached block, whole new blocks, then a fresh
+        # cached block; convert maps cached uniforms or raw words into out.
+        N, n = self.N, len(out)
+        filled = 0
+        if self.index:
+            take = min(N - self.index, n)
+            convert(out[:take], self._uniforms[self.index:self.index + take], False)
+            self.index = (self.index + take) % N
+            filled = take
+        step = 64 * N
+        while n - filled >= N:
+            full = min((n - filled) // N * N, step)
+            convert(out[filled:filled + full], self._raw_blocks(np.empty(full, dtype=np.uint32)), True)
+            filled += full
+        if filled < n:
+            self._next_block()
+            take = n - filled
+            convert(out[filled:], self._uniforms[:take], False)
+            self.index = take
+        return out
+
+    @staticmethod
+    def _as_raw(out, values, raw):
+        # The cache holds y / (2^32 - 1); rint recovers y exactly since the
+        # rounding error is far below 1/2.
+        out[:] = values if raw else np.rint(values * 0xFFFFFFFF)
+
+    @staticmethod
+    def _as_uniform(out, values, raw):
+        if raw:
+            np.divide(values, 0xFFFFFFFF, out=out)
+        else:
+            out[:] = values
+
+    def random_raw(self, n=1, out=None):
+        if out is None:
+            out = np.empty(n, dtype=np.uint32)
+        return self._draw(out, self._as_raw)
+
+    def extract_numbers(self, n=1, out=None):
+        # Small requests inside the cached block are a single slice copy.
+        index = self.index
+        if out is None:
+            if index and n <= self.N - index:
+                self.index = (index + n) % self.N
+                return self._uniforms[index:index + n].copy()
+            out = np.empty(n, dtype=np.float64)
+        elif index and len(out) <= self.N - index:
+            n = len(out)
+            self.index = (index + n) % self.N
+            out[:] = self._uniforms[index:index + n]
+            return out
+        return self._draw(out, self._as_uniform)
+
+class BufferedUniforms:
+    # The engine's uniforms, in the same order, served from blocks of
+    # `block` values tempered ahead of time. With background=True a thread keeps
+    # up to `depth` blocks queued, so a draw is a list read and the twist
+    # never runs on the caller's thread. With background=False each block is
+    # filled when the previous one runs out (one pause every `block` draws).
+    # The engine belongs to this object until close(); its state runs ahead of
+    # the values handed out. Only uniforms are served (no random_raw, state or
+    # skip), so it cannot be the engine of a PDGenerator.
+    def __init__(self, engine, block=1 << 16, depth=2, background=True):
+        check_param(block > 0 and depth > 0, "block and depth must be positive")
+        self.engine = engine
+        self.block = block
+        self._values = []
+        self._pos = 0
+        self._closed = False
+        self._queue = None
+        if background:
+            self._queue = queue.Queue(maxsize=depth)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._fill, daemon=True)
+            self._thread.start()
+
+    def _next_block(self):
+        return self.engine.extract_numbers(self.block).tolist()
+
+    def _fill(self):
+        # Built a few engine blocks at a time, letting go of the GIL in between
+        # so the consumer never waits long for it.
+        step = 4 * self.engine.N
+        try:
+            while not self._stop.is_set():
+                values = []
+                for start in range(0, self.block, step):
+                    values += self.engine.extract_numbers(min(step, self.block - start)).tolist()
+                    time.sleep(0)
+                self._put(values)
+        except Exception as error:
+            self._put(error)
+
+    def _put(self, item):
+        # Gives up once close() is called, so the thread can always be joined.
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _refill(self):
+        if self._closed:
+            raise ValueError("draw from a closed BufferedUniforms")
+        if self._queue is None:
+            self._values = self._next_block()
+        else:
+            values = self._queue.get()
+            if isinstance(values, Exception):
+                # The fill thread has stopped; fail every later draw too.
+                self.close()
+                raise values
+            self._values = values
+        self._pos = 0
+
+    def extract_number(self):
+        if self._pos == len(self._values):
+            self._refill()
+        value = self._values[self._pos]
+        self._pos += 1
+        return value
+
+    def extract_numbers(self, n=1, out=None):
+        if out is None:
+            out = np.empty(n, dtype=np.float64)
+        n = len(out)
+        filled = 0
+        while filled < n:
+            if self._pos == len(self._values):
+                self._refill()
+            take = min(len(self._values) - self._pos, n - filled)
+            out[filled:filled + take] = self._values[self._pos:self._pos + take]
+            self._pos += take
+            filled += take
+        return out
+
+    def close(self):
+        # Later draws raise ValueError, including from values already buffered.
+        self._closed = True
+        self._values = []
+        self._pos = 0
+        if self._queue is not None and self._thread.is_alive():
+            self._stop.set()
+            self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+POIS_PTRS_LAMBDA = 10
+
+@functools.lru_cache(maxsize=128)
+def pois_cdf_table(lamb):
+    # Running sum of the same pmf terms PDGenerator.pois_pmf gives, up to the
+    # point where it stops changing in float.
+    cdf = [math.e**(-lamb)]
+    n = 1
+    while True:
+        P = cdf[-1] + (math.e**(-lamb))*((lamb)**n)/(math.factorial(n))
+        if P == cdf[-1]:
+            break
+        cdf.append(P)
+        n += 1
+    cdf = np.array(cdf)
+    cdf.flags.writeable = False
+    return cdf
+
+BINO_BTRD_MEAN = 10
+NORM_METHODS = ("approx", "polar", "ziggurat")
+# Batches up to this size are drawn one value at a time from the engine's
+# tempered block, which is cheaper than a round of array operations.
+SMALL_BATCH = 4
+# The same for the rejection loops, whose array rounds cost far more.
+SMALL_LOOP_BATCH = 64
+PREPARED_CACHE_SIZE = 8
+# Smallest nonzero uniform the engine returns. The kernels that take a log
+# of U raise a zero (one word in 2^32) to it instead of returning inf; geom
+# also keeps U below 1, where it would return 0.
+UNIF_MIN = 1 / 0xFFFFFFFF
+# Largest scratch buffer a generator keeps between calls (16 engine blocks);
+# bigger requests get a temporary array.
+SCRATCH_SIZE = 16 * 624
+DISTRIBUTIONS = ("unif", "disc_unif", "triangular", "expo", "weibull", "gamma", "erlang", "norm",
+                 "chi2", "lognorm", "t_student", "bern", "bino", "geom", "negbin", "pois")
+DISCRETE_DISTRIBUTIONS = ("disc_unif", "bern", "bino", "geom", "negbin", "pois")
+
+def check_param(condition, message):
+    if not condition:
+        raise ValueError(message)
+
+@functools.lru_cache(maxsize=None)
+def ziggurat_tables(layers=128, r=3.442619855899, v=9.91256303526217e-3):
+    # Layer edges X[0..layers] (X[0] is the base strip's equivalent width, X[1] = r,
+    # X[layers] = 0) and the ratios R[i] = X[i+1] / X[i] used by the fast accept test.
+    X = np.zeros(layers + 1)
+    f = math.exp(-0.5 * r * r)
+    X[0] = v / f
+    X[1] = r
+    for i in range(2, layers):
+        X[i] = math.sqrt(-2 * math.log(v / X[i - 1] + f))
+        f = math.exp(-0.5 * X[i] * X[i])
+    R = X[1:] / X[:-1]
+    X.flags.writeable = False
+    R.flags.writeable = False
+    return X, R
+
+def log_factorial(k):
+    # math.lgamma(k + 1) elementwise, evaluated once per distinct value of k.
+    values, inverse = np.unique(k, return_inverse=True)
+    return np.array([math.lgamma(v + 1) for v in values.tolist()])[inverse.reshape(np.shape(k))]
+
+@functools.lru_cache(maxsize=128)
+def bino_cdf_table(m, p):
+    # CDF of Binomial(m, p) by the pmf recurrence, for inversion when m*p is small.
+    pmf = (1 - p) ** m
+    cdf = [pmf]
+    for k in range(m):
+        pmf *= (m - k) / (k + 1) * p / (1 - p)
+        P = cdf[-1] + pmf
+        if P == cdf[-1] and k + 1 > m * p:
+            break
+        cdf.append(P)
+    cdf = np.array(cdf)
+    cdf.flags.writeable = False
+    return cdf
+
+def substream_key(seed, spawn_key):
+    # 256-bit init_by_array key for substream `spawn_key` of master `seed`.
+    # Hashed as plain ints, so np.int64(3) and 3, or a list and a tuple of
+    # the same seed words, give the same substream.
+    if isinstance(seed, (int, np.integer)):
+        seed = int(seed)
+    else:
+        seed = tuple(int(word) for word in seed)
+    spawn_key = tuple(int(i) for i in spawn_key)
+    digest = hashlib.sha256(repr(("PDGenerator", seed, spawn_key)).encode()).digest()
+    return list(struct.unpack("<8I", digest))
+
+def seed_words(seed):
+    # Little-endian 32-bit words of a non-negative int, as random.seed splits
+    # it. Passing them as the seed opts a 64-bit or larger seed into
+    # init_by_array; the int itself keeps seeding through init_genrand.
+    seed = int(seed)
+    check_param(seed >= 0, "seed_words requires a non-negative int")
+    words = [seed & 0xFFFFFFFF]
+    seed >>= 32
+    while seed:
+        words.append(seed & 0xFFFFFFFF)
+        seed >>= 32
+    return words
+
+def seed_key(seed, spawn_key=()):
+    # init_by_array key for a PDGenerator seed, or None to use init_genrand.
+    # Int seeds always use init_genrand, so archived seeds keep their streams;
+    # sequences are taken as the key words themselves.
+    if spawn_key:
+        return substream_key(seed, spawn_key)
+    if isinstance(seed, (int, np.integer)):
+        return None
+    words = [int(word) for word in seed]
+    check_param(len(words) > 0, "seed sequence must not be empty")
+    check_param(all(0 <= word < 2**32 for word in words), "seed words must be in [0, 2^32)")
+    return words
+
+def init_genrand_states(seeds):
+    # (K, 624) uint32 init_genrand states, one recurrence step for all K seeds
+    # at a time. Same words as MersenneTwister(seed).MT for any int seed.
+    seeds = [int(seed) for seed in seeds]
+    MT = np.empty((624, len(seeds)), dtype=np.uint32)
+    MT[0] = [seed & 0xFFFFFFFF for seed in seeds]
+    MT[1] = [(1812433253 * (seed ^ (seed >> 30)) + 1) & 0xFFFFFFFF for seed in seeds]
+    for i in range(2, 624):
+        y = MT[i]
+        np.right_shift(MT[i - 1], 30, out=y)
+        y ^= MT[i - 1]
+        y *= np.uint32(1812433253)
+        y += np.uint32(i)
+    return np.ascontiguousarray(MT.T)
+
+def init_by_array_states(keys):
+    # (K, 624) uint32 init_by_array states for K keys of the same length,
+    # vectorized across keys like init_genrand_states.
+    keys = np.asarray(keys, dtype=np.uint32).T
+    length, K = keys.shape
+    MT = np.repeat(np.array(MersenneTwister(19650218).MT, dtype=np.uint32)[:, None], K, axis=1)
+    y = np.empty(K, dtype=np.uint32)
+    i, j = 1, 0
+    for _ in range(max(624, length)):
+        np.right_shift(MT[i - 1], 30, out=y)
+        y ^= MT[i - 1]
+        y *= np.uint32(1664525)
+        MT[i] ^= y
+        MT[i] += keys[j]
+        MT[i] += np.uint32(j)
+        i += 1
+        j += 1
+        if i >= 624:
+            MT[0] = MT[623]
+            i = 1
+        if j >= length:
+            j = 0
+    for _ in range(623):
+        np.right_shift(MT[i - 1], 30, out=y)
+        y ^= MT[i - 1]
+        y *= np.uint32(1566083941)
+        MT[i] ^= y
+        MT[i] -= np.uint32(i)
+        i += 1
+        if i >= 624:
+            MT[0] = MT[623]
+            i = 1
+    MT[0] = 0x80000000
+    return np.ascontiguousarray(MT.T)
+
+def seed_states(seeds, spawn_keys=None):
+    # (K, 624) states for K PDGenerator seeds (and optional spawn keys): plain
+    # seeds in one init_genrand pass, keyed ones in one pass per key length.
+    seeds = list(seeds)
+    if spawn_keys is None:
+        spawn_keys = [()] * len(seeds)
+    states = np.empty((len(seeds), 624), dtype=np.uint32)
+    plain, keyed = [], {}
+    for k, (seed, spawn_key) in enumerate(zip(seeds, spawn_keys)):
+        key = seed_key(seed, spawn_key)
+        if key is None:
+            plain.append(k)
+        else:
+            keyed.setdefault(len(key), []).append((k, key))
+    if plain:
+        states[plain] = init_genrand_states([seeds[k] for k in plain])
+    for items in keyed.values():
+        states[[k for k, _ in items]] = init_by_array_states([key for _, key in items])
+    return states
+
+class AliasSampler:
+    # Walker/Vose alias table over categories 0..K-1. Holds no generator state,
+    # so one table can be pickled to many workers, each sampling from its own
+    # PDGenerator.
+    def __init__(self, probs):
+        probs = np.asarray(probs, dtype=np.float64)
+        if probs.ndim != 1 or len(probs) == 0:
+            raise ValueError("probs must be a non-empty 1-D sequence")
+        if not np.all(np.isfinite(probs)) or np.any(probs < 0) or probs.sum() <= 0:
+            raise ValueError("probs must be finite, non-negative and not all zero")
+        K = len(probs)
+        q = (probs * (K / probs.sum())).tolist()
+        prob = [1.0] * K
+        alias = list(range(K))
+        small = [i for i in range(K) if q[i] < 1]
+        large = [i for i in range(K) if q[i] >= 1]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = q[s]
+            alias[s] = l
+            q[l] = (q[l] + q[s]) - 1
+            if q[l] < 1:
+                small.append(l)
+            else:
+                large.append(l)
+        self.prob = np.array(prob)
+        self.alias = np.array(alias, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.prob)
+
+    def sample(self, generator, n=1, out=None):
+        out = generator._out(n, out, np.int64)
+        K = len(self.prob)
+        U = generator.unif_array(out=generator._scratch(len(out)))
+        U *= K
+        np.minimum(U, K - 1, out=U)
+        out[:] = U
+        V = generator.unif_array(n=len(out))
+        use_alias = V >= self.prob[out]
+        out[use_alias] = self.alias[out[use_alias]]
+        return out
+
+class FrozenDistribution:
+    # One distribution with its parameters validated and its constants and
+    # tables precomputed, so rvs() only draws.
+    def __init__(self, generator, name, **params):
+        check_param(name in DISTRIBUTIONS, f"unknown distribution {name!r}")
+        self.generator = generator
+        self.name = name
+        self.params = params
+        self.dtype = np.int64 if name in DISCRETE_DISTRIBUTIONS else np.float64
+        self._draw = getattr(generator, "_prepare_" + name)(**params)
+
+    def __repr__(self):
+        params = ", ".join(f"{k}={v!r}" for k, v in self.params.items())
+        return f"FrozenDistribution({self.name}, {params})"
+
+    def __getstate__(self):
+        # The draw closure is bound to the generator it was prepared on, so
+        # copies and pickles prepare it again on their own generator.
+        return {"generator": self.generator, "name": self.name, "params": self.params}
+
+    def __setstate__(self, state):
+        self.__init__(state["generator"], state["name"], **state["params"])
+
+    def rvs(self, n=1, out=None):
+        if out is None:
+            return self._draw(np.empty(n, dtype=self.dtype))
+        return self._draw(self.generator._out(n, out, self.dtype))
+
 class PDGenerator:
-    def __init__(self, seed=0):
+    __slots__ = ("random_seed", "spawn_key", "norm_method", "random", "_buffer", "_draws", "_n_children")
+
+    def __init__(self, seed=0, spawn_key=(), norm_method="approx", engine=None):
+        # `engine` is an already seeded MersenneTwisterNP to use as is.
+        if norm_method not in NORM_METHODS:
+            raise ValueError(f"norm_method must be one of {NORM_METHODS}")
+        if engine is not None and not isinstance(engine, MersenneTwisterNP):
+            raise ValueError("engine must be a MersenneTwisterNP")
         self.random_seed = seed
-        self.random = MersenneTwister(seed)
+        self.spawn_key = tuple(spawn_key)
+        self.norm_method = norm_method
+        if engine is None:
+            engine = MersenneTwisterNP()
+            key = seed_key(seed, self.spawn_key)
+            if key is None:
+                engine.init_genrand(seed)
+            else:
+                engine.init_by_array(key)
+        self.random = engine
+        self._buffer = None
+        self._draws = {}
+        self._n_children = 0
+
+    def __getstate__(self):
+        # The prepared closures in _draws are bound to this instance, so copies
+        # and pickles start with an empty cache.
+        return {name: getattr(self, name) for name in self.__slots__ if name != "_draws"}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self._draws = {}
+
+    @classmethod
+    def batch(cls, seeds, spawn_keys=None, norm_method="approx"):
+        # PDGenerator(seed) for every seed, seeded together by seed_states.
+        seeds = list(seeds)
+        if spawn_keys is None:
+            spawn_keys = [()] * len(seeds)
+        spawn_keys = [tuple(spawn_key) for spawn_key in spawn_keys]
+        states = seed_states(seeds, spawn_keys)
+        return [cls(seed, spawn_key, norm_method, MersenneTwisterNP.from_state(state))
+                for seed, spawn_key, state in zip(seeds, spawn_keys, states)]
+
+    def get_state(self):
+        return self.random.get_state()
+
+    def set_state(self, state):
+        self.random.set_state(state)
+
+    def skip(self, k):
+        self.random.skip(k)
+
+    def substream(self, i):
+        return PDGenerator(seed=self.random_seed, spawn_key=self.spawn_key + (i,), norm_method=self.norm_method)
+
+    def spawn(self, n=1):
+        spawn_keys = [self.spawn_key + (i,) for i in range(self._n_children, self._n_children + n)]
+        children = PDGenerator.batch([self.random_seed] * n, spawn_keys, self.norm_method)
+        self._n_children += n
+        return children
 
     def unif(self, n=1, a=0, b=1):
-        unif_rvs = [(a + (b-a)*self.random.extract_number()) for i in range(n)]
+        unif_rvs = self.unif_array(n=n, a=a, b=b).tolist()
         return unif_rvs
     def disc_unif(self, n=1, a=0, b=1):
         unif_rvs = self.unif(n=n)
@@ -55,11 +695,15 @@ class PDGenerator:
 
     def weibull(self, n=1, lamb=1, beta=1):
         unif_rvs = self.unif(n=n)
-        weibull_rvs = [((-math.log(U))**(1/beta)/lamb) for U in unif_rvs]
+        weibull_rvs = [((-math.log(max(U, UNIF_MIN)))**(1/beta)/lamb) for U in unif_rvs]
         return weibull_rvs
 
+    def gamma(self, n=1, shape=1, scale=1):
+        gamma_rvs = self.gamma_array(n=n, shape=shape, scale=scale).tolist()
+        return gamma_rvs
+
     def erlang(self, n=1, m=2, lamb=1):
-        erlang_rvs = [sum(self.expo(n=m, lamb=lamb)) for i in range(n)]
+        erlang_rvs = self.erlang_array(n=n, m=m, lamb=lamb).tolist()
         return erlang_rvs
 
 
@@ -69,30 +713,33 @@ class PDGenerator:
         else: return 0
 
     def t(self, U):
-        ln_u = math.log(min(U, 1 - U))
+        ln_u = math.log(max(min(U, 1 - U), UNIF_MIN))
         t = (-2 * ln_u)**0.5
         return t
 
-    def norm(self, n=1, mu=0, sigma=1):
+    def norm(self, n=1, mu=0, sigma=1, method=None):
+        if (method or self.norm_method) != "approx":
+            return self.norm_array(n=n, mu=mu, sigma=sigma, method=method).tolist()
         unif_rvs = []
         while len(unif_rvs) < n:
             unif_rvs += [u for u in self.unif(n=n*2) if 0 <= u <= 1]
+        if Instrumentation.enabled:
+            Instrumentation.rejected(len(unif_rvs) - n)
         z_norm_rvs = [(self.sign(U-0.5)*(self.t(U) - ((2.515517 + 0.802853*self.t(U) + 0.010328*self.t(U)**2)/(1 + 1.432788*self.t(U) + 0.189269*self.t(U)**2 + 0.001308*self.t(U)**3)))) for U in unif_rvs[:n]]
         norm_rvs = [mu + sigma*Z for Z in z_norm_rvs]
         return norm_rvs
 
-    def chi2(self, n=1, m=2):
-        chi2_rvs = [sum(x ** 2 for x in self.norm(n=m)) for i in range(n)]
+    def chi2(self, n=1, m=2, method=None):
+        chi2_rvs = self.chi2_array(n=n, m=m, method=method).tolist()
         return chi2_rvs
 
-    def lognorm(self, n=1, mu=0, sigma=1):
-        norm_rvs = self.norm(n=n, mu=mu, sigma=sigma)
+    def lognorm(self, n=1, mu=0, sigma=1, method=None):
+        norm_rvs = self.norm(n=n, mu=mu, sigma=sigma, method=method)
         lognorm_rvs = [math.exp(N) for N in norm_rvs]
         return lognorm_rvs
 
-    def t_student(self, n=1, m=1):
-        norm_rvs = self.norm(n=n * m, mu=0, sigma=1)
-        t_rvs = [(N / (self.chi2(n=m)[0] / m) ** 0.5) for N in norm_rvs]
+    def t_student(self, n=1, m=1, method=None):
+        t_rvs = self.t_student_array(n=n, m=m, method=method).tolist()
         return t_rvs
 
     def bern(self, n=1, p=0.5):
@@ -101,33 +748,655 @@ class PDGenerator:
         return bern_rvs
 
     def bino(self, n=1, m=2, p=0.5):
-        bino_rvs = [sum(self.bern(n=m, p=p)) for i in range(n)]
+        bino_rvs = self.bino_array(n=n, m=m, p=p).tolist()
         return bino_rvs
 
     def geom(self, n=1, p=0.5):
         unif_rvs = self.unif(n=n)
-        geom_rvs = [math.ceil((math.log(U))/(math.log(1-p))) for U in unif_rvs]
+        geom_rvs = [math.ceil((math.log(min(max(U, UNIF_MIN), 1 - UNIF_MIN)))/(math.log(1-p))) for U in unif_rvs]
         return geom_rvs
 
     def negbin(self, n=1, m=2, p=0.5):
-        negbin_rvs = [sum(self.geom(n=m, p=p)) for i in range(n)]
+        negbin_rvs = self.negbin_array(n=n, m=m, p=p).tolist()
         return negbin_rvs
 
     def pois_pmf(self, n=0,lamb=1):
         return (math.e**(-lamb))*((lamb)**n)/(math.factorial(n))
 
     def pois(self, n=1, lamb=1):
-        pois_rvs = []
-        while len(pois_rvs) < n:
-            U = self.unif(n=1)[0]
-            X = 0
-            P = self.pois_pmf(X, lamb)
-            while U >= P:
-                X += 1
-                P += self.pois_pmf(X, lamb)
-            pois_rvs.append(X)
+        pois_rvs = self.pois_array(n=n, lamb=lamb).tolist()
         return pois_rvs
 
+    def discrete(self, probs):
+        return AliasSampler(probs)
+
+    def frozen(self, name, **params):
+        return FrozenDistribution(self, name, **params)
+
+    # Array API: same distributions as above, returned as contiguous float64 /
+    # int64 arrays. Passing out= refills a preallocated array of length n.
+    def _out(self, n, out, dtype):
+        if out is None:
+            return np.empty(n, dtype=dtype)
+        if not isinstance(out, np.ndarray) or out.dtype != dtype or out.ndim != 1 or not out.flags.c_contiguous:
+            raise ValueError(f"out must be a contiguous 1-D {np.dtype(dtype).name} array")
+        return out
+
+    def _scratch(self, n):
+        if n > SCRATCH_SIZE:
+            return np.empty(n, dtype=np.float64)
+        if self._buffer is None or len(self._buffer) < n:
+            self._buffer = np.empty(n, dtype=np.float64)
+        return self._buffer[:n]
+
+    def _prepared(self, name, **params):
+        # The _prepare_<name> closure for these parameters, kept for the last
+        # few parameter sets so repeated *_array calls skip validation and setup.
+        key = (name, self.norm_method, tuple(params.items()))
+        try:
+            return self._draws[key]
+        except KeyError:
+            pass
+        except TypeError:
+            return getattr(self, "_prepare_" + name)(**params)
+        if len(self._draws) >= PREPARED_CACHE_SIZE:
+            self._draws.clear()
+        draw = self._draws[key] = getattr(self, "_prepare_" + name)(**params)
+        return draw
+
+    def _small(self, one, draw):
+        # `one` maps a single uniform with the same NumPy ufuncs as `draw`, so
+        # small and large batches give bit-identical values.
+        def small_or_array(out):
+            if len(out) > SMALL_BATCH:
+                return draw(out)
+            extract_number = self.random.extract_number
+            for i in range(len(out)):
+                out[i] = one(extract_number())
+            return out
+        return small_or_array
+
+    def unif_array(self, n=1, a=0, b=1, out=None):
+        return self._prepared("unif", a=a, b=b)(self._out(n, out, np.float64))
+
+    def _prepare_unif(self, a=0, b=1):
+        scaled = a != 0 or b != 1
+        width = b - a
+        def draw(out):
+            self.random.extract_numbers(out=out)
+            if scaled:
+                out *= width
+                out += a
+            return out
+        return draw
+
+    def disc_unif_array(self, n=1, a=0, b=1, out=None):
+        return self._prepared("disc_unif", a=a, b=b)(self._out(n, out, np.int64))
+
+    def _prepare_disc_unif(self, a=0, b=1):
+        check_param(a <= b, "disc_unif requires a <= b")
+        width = b - a + 1
+        def draw(out):
+            U = self.random.extract_numbers(out=self._scratch(len(out)))
+            U *= width
+            U += a
+            np.trunc(U, out=U)
+            out[:] = U
+            return out
+        return self._small(lambda u: u * width + a, draw)
+
+    def triangular_array(self, n=1, a=0, b=1, c=None, out=None):
+        return self._prepared("triangular", a=a, b=b, c=c)(self._out(n, out, np.float64))
+
+    def _prepare_triangular(self, a=0, b=1, c=None):
+        if c is None:
+            c = (a + b) / 2
+        check_param(a < b and a <= c <= b, "triangular requires a < b and a <= c <= b")
+        mode_cdf = (c - a) / (b - a)
+        left_area = (b - a) * (c - a)
+        right_area = (b - a) * (b - c)
+        def draw(out):
+            U = self.random.extract_numbers(out=self._scratch(len(out)))
+            left = U < mode_cdf
+            out[:] = b - np.sqrt((1 - U) * right_area)
+            out[left] = a + np.sqrt(U[left] * left_area)
+            return out
+        def one(u):
+            if u < mode_cdf:
+                return a + np.sqrt(u * left_area)
+            return b - np.sqrt((1 - u) * right_area)
+        return self._small(one, draw)
+
+    def expo_array(self, n=1, lamb=1, out=None):
+        return self._prepared("expo", lamb=lamb)(self._out(n, out, np.float64))
+
+    def _prepare_expo(self, lamb=1):
+        return self._prepare_weibull(lamb=lamb, beta=1)
+
+    def weibull_array(self, n=1, lamb=1, beta=1, out=None):
+        return self._prepared("weibull", lamb=lamb, beta=beta)(self._out(n, out, np.float64))
+
+    def _prepare_weibull(self, lamb=1, beta=1):
+        check_param(lamb > 0 and beta > 0, "weibull requires lamb > 0 and beta > 0")
+        inv_beta = 1 / beta
+        def draw(out):
+            self.random.extract_numbers(out=out)
+            np.maximum(out, UNIF_MIN, out=out)
+            np.log(out, out=out)
+            np.negative(out, out=out)
+            if beta != 1:
+                np.power(out, inv_beta, out=out)
+            out /= lamb
+            return out
+        def one(u):
+            x = -np.log(max(u, UNIF_MIN))
+            if beta != 1:
+                x = np.power(x, inv_beta)
+            return x / lamb
+        return self._small(one, draw)
+
+    def gamma_array(self, n=1, shape=1, scale=1, method=None, out=None):
+        return self._prepared("gamma", shape=shape, scale=scale, method=method)(self._out(n, out, np.float64))
+
+    def _prepare_gamma(self, shape=1, scale=1, method=None):
+        # Marsaglia & Tsang (2000); shape < 1 is boosted via Gamma(shape+1) * U^(1/shape).
+        check_param(shape > 0 and scale > 0, "gamma requires shape > 0 and scale > 0")
+        norm = self._prepare_norm(method=method)
+        d = (shape + 1 if shape < 1 else shape) - 1 / 3
+        c = 1 / math.sqrt(9 * d)
+        def squeeze(out):
+            pending = np.arange(len(out))
+            while len(pending):
+                x = norm(np.empty(len(pending)))
+                U = self.unif_array(n=len(pending))
+                v = 1 + c * x
+                v = v * v * v
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    accept = (v > 0) & ((U < 1 - 0.0331 * x ** 4) | (np.log(U) < 0.5 * x * x + d * (1 - v + np.log(v))))
+                out[pending[accept]] = d * v[accept]
+                pending = pending[~accept]
+                if Instrumentation.enabled:
+                    Instrumentation.rejected(len(pending))
+        def squeeze_small(out):
+            # squeeze() one value at a time, in the same rounds and with the
+            # same uniforms. The accept test uses math, which can only differ
+            # from NumPy's ufuncs in the last bit (log(0) = -inf accepts).
+            pending = list(range(len(out)))
+            while pending:
+                x = norm(np.empty(len(pending))).tolist()
+                U = self.random.extract_numbers(len(pending)).tolist()
+                rejected = []
+                for i, xi, ui in zip(pending, x, U):
+                    v = 1 + c * xi
+                    v = v * v * v
+                    if v > 0 and (ui < 1 - 0.0331 * xi ** 4 or ui == 0 or math.log(ui) < 0.5 * xi * xi + d * (1 - v + math.log(v))):
+                        out[i] = d * v
+                    else:
+                        rejected.append(i)
+                pending = rejected
+                if Instrumentation.enabled:
+                    Instrumentation.rejected(len(pending))
+        def draw(out):
+            if len(out) <= SMALL_LOOP_BATCH:
+                squeeze_small(out)
+            else:
+                squeeze(out)
+            if shape < 1:
+                U = self.unif_array(n=len(out))
+                out *= U ** (1 / shape)
+            if scale != 1:
+                out *= scale
+            return out
+        return draw
+
+    def erlang_array(self, n=1, m=2, lamb=1, out=None):
+        return self._prepared("erlang", m=m, lamb=lamb)(self._out(n, out, np.float64))
+
+    def _prepare_erlang(self, m=2, lamb=1):
+        check_param(lamb > 0, "erlang requires lamb > 0")
+        return self._prepare_gamma(shape=m, scale=1 / lamb)
+
+    def norm_array(self, n=1, mu=0, sigma=1, method=None, out=None):
+        return self._prepared("norm", mu=mu, sigma=sigma, method=method)(self._out(n, out, np.float64))
+
+    def _prepare_norm(self, mu=0, sigma=1, method=None):
+        method = method or self.norm_method
+        check_param(method in NORM_METHODS, f"method must be one of {NORM_METHODS}")
+        check_param(sigma >= 0, "norm requires sigma >= 0")
+        standard = getattr(self, "_norm_" + method)
+        def draw(out):
+            standard(out)
+            if sigma != 1:
+                out *= sigma
+            if mu != 0:
+                out += mu
+            return out
+        if method != "approx":
+            return draw
+        def one(u):
+            t = np.sqrt(-2 * np.log(max(min(u, 1 - u), UNIF_MIN)))
+            t2, t3 = np.square(t), np.power(t, 3)
+            z = np.sign(u - 0.5) * (t - (2.515517 + 0.802853*t + 0.010328*t2)/(1 + 1.432788*t + 0.189269*t2 + 0.001308*t3))
+            if sigma != 1:
+                z *= sigma
+            if mu != 0:
+                z += mu
+            return z
+        return self._small(one, draw)
+
+    def _norm_approx(self, out):
+        # Rational approximation of the inverse normal CDF used by norm().
+        self.random.extract_numbers(out=out)
+        sign = np.sign(out - 0.5)
+        np.minimum(out, 1 - out, out=out)
+        np.maximum(out, UNIF_MIN, out=out)
+        np.log(out, out=out)
+        out *= -2
+        t = np.sqrt(out, out=out)
+        z = t - (2.515517 + 0.802853*t + 0.010328*t**2)/(1 + 1.432788*t + 0.189269*t**2 + 0.001308*t**3)
+        np.multiply(sign, z, out=out)
+        return out
+
+    def _norm_polar(self, out):
+        # Marsaglia polar method: each accepted point in the unit disc gives two normals.
+        filled = 0
+        while filled < len(out):
+            m = int((len(out) - filled) / 2 / 0.785) + 8
+            u = 2 * self.unif_array(n=m) - 1
+            v = 2 * self.unif_array(n=m) - 1
+            s = u * u + v * v
+            ok = (s > 0) & (s < 1)
+            u, v, s = u[ok], v[ok], s[ok]
+            if Instrumentation.enabled:
+                Instrumentation.rejected(m - len(s))
+            f = np.sqrt(-2 * np.log(s) / s)
+            z = np.stack((u * f, v * f), axis=1).ravel()[:len(out) - filled]
+            out[filled:filled + len(z)] = z
+            filled += len(z)
+        return out
+
+    def _norm_ziggurat(self, out):
+        # 128-layer Ziggurat (Marsaglia & Tsang, 2000, in Doornik's 2005 form).
+        X, R = ziggurat_tables()
+        r = X[1]
+        pending = np.arange(len(out))
+        while len(pending):
+            i = (self.random.random_raw(len(pending)) & 0x7F).astype(np.intp)
+            u = 2 * self.unif_array(n=len(pending)) - 1
+            x = u * X[i]
+            accept = np.abs(u) < R[i]
+            rest = np.flatnonzero(~accept)
+            wedge = rest[i[rest] != 0]
+            if len(wedge):
+                iw, xw = i[wedge], x[wedge]
+                f0 = np.exp(-0.5 * (X[iw] * X[iw] - xw * xw))
+                f1 = np.exp(-0.5 * (X[iw + 1] * X[iw + 1] - xw * xw))
+                accept[wedge] = f1 + self.unif_array(n=len(wedge)) * (f0 - f1) < 1
+            tail = rest[i[rest] == 0]
+            todo = np.arange(len(tail))
+            while len(todo):
+                with np.errstate(divide="ignore"):
+                    xt = np.log(self.unif_array(n=len(todo))) / r
+                    yt = np.log(self.unif_array(n=len(todo)))
+                ok = (-2 * yt >= xt * xt) & np.isfinite(xt)
+                done = tail[todo[ok]]
+                x[done] = np.where(u[done] < 0, xt[ok] - r, r - xt[ok])
+                accept[done] = True
+                todo = todo[~ok]
+                if Instrumentation.enabled:
+                    Instrumentation.rejected(len(todo))
+            out[pending[accept]] = x[accept]
+            pending = pending[~accept]
+            if Instrumentation.enabled:
+                Instrumentation.rejected(len(pending))
+        return out
+
+    def chi2_array(self, n=1, m=2, method=None, out=None):
+        return self._prepared("chi2", m=m, method=method)(self._out(n, out, np.float64))
+
+    def _prepare_chi2(self, m=2, method=None):
+        check_param(m > 0, "chi2 requires m > 0")
+        return self._prepare_gamma(shape=m / 2, scale=2, method=method)
+
+    def lognorm_array(self, n=1, mu=0, sigma=1, method=None, out=None):
+        return self._prepared("lognorm", mu=mu, sigma=sigma, method=method)(self._out(n, out, np.float64))
+
+    def _prepare_lognorm(self, mu=0, sigma=1, method=None):
+        norm = self._prepare_norm(mu=mu, sigma=sigma, method=method)
+        def draw(out):
+            return np.exp(norm(out), out=out)
+        return draw
+
+    def t_student_array(self, n=1, m=1, method=None, out=None):
+        return self._prepared("t_student", m=m, method=method)(self._out(n, out, np.float64))
+
+    def _prepare_t_student(self, m=1, method=None):
+        check_param(m > 0, "t_student requires m > 0")
+        norm = self._prepare_norm(method=method)
+        chi2 = self._prepare_chi2(m=m, method=method)
+        def draw(out):
+            norm(out)
+            chi2_rvs = chi2(np.empty(len(out)))
+            chi2_rvs /= m
+            out /= np.sqrt(chi2_rvs, out=chi2_rvs)
+            return out
+        return draw
+
+    def bern_array(self, n=1, p=0.5, out=None):
+        return self._prepared("bern", p=p)(self._out(n, out, np.int64))
+
+    def _prepare_bern(self, p=0.5):
+        check_param(0 <= p <= 1, "bern requires 0 <= p <= 1")
+        def draw(out):
+            U = self.random.extract_numbers(out=self._scratch(len(out)))
+            np.less_equal(U, p, out=out, casting="unsafe")
+            return out
+        return self._small(lambda u: u <= p, draw)
+
+    def bino_array(self, n=1, m=2, p=0.5, out=None):
+        return self._prepared("bino", m=m, p=p)(self._out(n, out, np.int64))
+
+    def _prepare_bino(self, m=2, p=0.5):
+        check_param(m >= 0 and m == int(m), "bino requires a non-negative integer m")
+        check_param(0 <= p <= 1, "bino requires 0 <= p <= 1")
+        m = int(m)
+        q = min(p, 1 - p)
+        if q == 0 or m == 0:
+            def sample(out):
+                out[:] = 0
+                return out
+        elif m * q < BINO_BTRD_MEAN:
+            cdf = bino_cdf_table(m, q)
+            cdf_list = cdf.tolist()
+            def inversion(out):
+                U = self.random.extract_numbers(out=self._scratch(len(out)))
+                out[:] = np.searchsorted(cdf, U, side="right")
+                np.minimum(out, m, out=out)
+                return out
+            sample = self._small(lambda u: min(bisect.bisect_right(cdf_list, u), m), inversion)
+        else:
+            sample = self._prepare_btrd(m, q)
+        if q == p:
+            return sample
+        def draw(out):
+            sample(out)
+            np.subtract(m, out, out=out)
+            return out
+        return draw
+
+    def _prepare_btrd(self, m, p):
+        # BTRD transformed rejection (Hormann, 1993) for m*p >= 10, p <= 0.5.
+        # The exact acceptance test compares against pmf(k)/pmf(mode) via lgamma.
+        mode = math.floor((m + 1) * p)
+        log_r = math.log(p / (1 - p))
+        spq = math.sqrt(m * p * (1 - p))
+        b = 1.15 + 2.53 * spq
+        a = -0.0873 + 0.0248 * b + 0.01 * p
+        c = m * p + 0.5
+        alpha = (2.83 + 5.1 / b) * spq
+        vr = 0.92 - 4.2 / b
+        urvr = 0.86 * vr
+        log_f_mode = math.lgamma(mode + 1) + math.lgamma(m - mode + 1)
+        def draw(out):
+            pending = np.arange(len(out))
+            while len(pending):
+                V = self.unif_array(n=len(pending))
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    fast = V <= urvr
+                    U = V / vr - 0.43
+                    k = np.floor((2 * a / (0.5 - np.abs(U)) + b) * U + c)
+                    slow = np.flatnonzero(~fast)
+                    Vs = V[slow]
+                    W = self.unif_array(n=len(slow))
+                    outer = Vs >= vr
+                    Us = np.where(outer, W - 0.5, Vs / vr - 0.93)
+                    Us = np.where(outer, Us, np.sign(Us) * 0.5 - Us)
+                    Vs = np.where(outer, Vs, W * vr)
+                    us = 0.5 - np.abs(Us)
+                    ks = np.floor((2 * a / us + b) * Us + c)
+                    ok = (us > 0) & (ks >= 0) & (ks <= m)
+                    Vs = Vs * alpha / (a / (us * us) + b)
+                ok_idx = np.flatnonzero(ok)
+                kk = ks[ok_idx]
+                log_ratio = log_f_mode - log_factorial(kk) - log_factorial(m - kk) + (kk - mode) * log_r
+                ok[ok_idx] = np.log(Vs[ok_idx]) <= log_ratio
+                fast[slow[ok]] = True
+                k[slow] = ks
+                out[pending[fast]] = k[fast]
+                pending = pending[~fast]
+                if Instrumentation.enabled:
+                    Instrumentation.rejected(len(pending))
+            return out
+        return draw
+
+    def geom_array(self, n=1, p=0.5, out=None):
+        return self._prepared("geom", p=p)(self._out(n, out, np.int64))
+
+    def _prepare_geom(self, p=0.5):
+        check_param(0 < p <= 1, "geom requires 0 < p <= 1")
+        if p == 1:
+            def draw(out):
+                out[:] = 1
+                return out
+            return draw
+        log_q = math.log(1 - p)
+        def draw(out):
+            U = self.random.extract_numbers(out=self._scratch(len(out)))
+            np.clip(U, UNIF_MIN, 1 - UNIF_MIN, out=U)
+            np.log(U, out=U)
+            U /= log_q
+            np.ceil(U, out=U)
+            out[:] = U
+            return out
+        return self._small(lambda u: np.ceil(np.log(min(max(u, UNIF_MIN), 1 - UNIF_MIN)) / log_q), draw)
+
+    def negbin_array(self, n=1, m=2, p=0.5, out=None):
+        return self._prepared("negbin", m=m, p=p)(self._out(n, out, np.int64))
+
+    def _prepare_negbin(self, m=2, p=0.5):
+        # Sum of m Geom(p) on {1, 2, ...} = m + NegBin failures, drawn as a
+        # Poisson(Gamma(m, (1-p)/p)) mixture.
+        check_param(m > 0 and m == int(m), "negbin requires a positive integer m")
+        check_param(0 < p <= 1, "negbin requires 0 < p <= 1")
+        m = int(m)
+        if p == 1:
+            def draw(out):
+                out[:] = m
+                return out
+            return draw
+        gamma = self._prepare_gamma(shape=m, scale=(1 - p) / p)
+        def draw(out):
+            self._pois_varying(out, gamma(np.empty(len(out))))
+            out += m
+            return out
+        return draw
+
+    def pois_array(self, n=1, lamb=1, out=None):
+        return self._prepared("pois", lamb=lamb)(self._out(n, out, np.int64))
+
+    def _prepare_pois(self, lamb=1):
+        check_param(lamb >= 0, "pois requires lamb >= 0")
+        if lamb >= POIS_PTRS_LAMBDA:
+            def draw(out):
+                return self._pois_ptrs(out, lamb)
+            return draw
+        cdf = pois_cdf_table(lamb)
+        cdf_list = cdf.tolist()
+        def draw(out):
+            U = self.random.extract_numbers(out=self._scratch(len(out)))
+            out[:] = np.searchsorted(cdf, U, side="right")
+            np.minimum(out, len(cdf) - 1, out=out)
+            return out
+        return self._small(lambda u: min(bisect.bisect_right(cdf_list, u), len(cdf_list) - 1), draw)
+
+    def _pois_ptrs(self, out, lamb):
+        # PTRS transformed rejection (Hormann, 1993). lamb is a scalar or one
+        # value per output; rejected positions are retried with fresh uniforms.
+        lamb = np.broadcast_to(np.asarray(lamb, dtype=np.float64), out.shape)
+        pending = np.arange(len(out))
+        while len(pending):
+            lam = lamb[pending]
+            slam = np.sqrt(lam)
+            b = 0.931 + 2.53 * slam
+            a = -0.059 + 0.02483 * b
+            U = self.unif_array(n=len(pending)) - 0.5
+            V = self.unif_array(n=len(pending))
+            us = 0.5 - np.abs(U)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                k = np.floor((2 * a / us + b) * U + lam + 0.43)
+                accept = (us >= 0.07) & (V <= 0.9277 - 3.6224 / (b - 2))
+                slow = np.flatnonzero(~accept & (us > 0) & (k >= 0) & ((us >= 0.013) | (V <= us)))
+                ks = k[slow]
+                lhs = np.log(V[slow]) + np.log(1.1239 + 1.1328 / (b[slow] - 3.4)) - np.log(a[slow] / (us[slow] * us[slow]) + b[slow])
+                rhs = -lam[slow] + ks * np.log(lam[slow]) - log_factorial(ks)
+            accept[slow] = lhs <= rhs
+            out[pending[accept]] = k[accept]
+            pending = pending[~accept]
+            if Instrumentation.enabled:
+                Instrumentation.rejected(len(pending))
+        return out
+
+    def _pois_varying(self, out, lamb):
+        # Poisson draws with one mean per output: sequential-search inversion
+        # for small means, PTRS for the rest.
+        if len(out) <= SMALL_LOOP_BATCH:
+            return self._pois_varying_small(out, lamb)
+        small = np.flatnonzero(lamb < POIS_PTRS_LAMBDA)
+        large = np.flatnonzero(lamb >= POIS_PTRS_LAMBDA)
+        if len(small):
+            lam = lamb[small]
+            U = self.unif_array(n=len(small))
+            X = np.zeros(len(small), dtype=np.int64)
+            P = np.exp(-lam)
+            S = P.copy()
+            active = np.flatnonzero((U >= S) & (P > 0))
+            while len(active):
+                X[active] += 1
+                P[active] *= lam[active] / X[active]
+                S[active] += P[active]
+                active = active[(U[active] >= S[active]) & (P[active] > 0)]
+            out[small] = X
+        if len(large):
+            out[large] = self._pois_ptrs(np.empty(len(large), dtype=np.int64), lamb[large])
+        return out
+
+    def _pois_varying_small(self, out, lamb):
+        # _pois_varying one value at a time, with the same uniforms in the same order.
+        lams = lamb.tolist()
+        small = [i for i, lam in enumerate(lams) if lam < POIS_PTRS_LAMBDA]
+        large = [i for i, lam in enumerate(lams) if lam >= POIS_PTRS_LAMBDA]
+        for i, u in zip(small, self.random.extract_numbers(len(small)).tolist()):
+            lam = lams[i]
+            x = 0
+            P = S = np.exp(-lam)
+            while u >= S and P > 0:
+                x += 1
+                P *= lam / x
+                S += P
+            out[i] = x
+        if large:
+            out[large] = self._pois_ptrs(np.empty(len(large), dtype=np.int64), lamb[large])
+        return out
+
+    # Streaming API: endless iterators of fixed-size array blocks. With
+    # reuse=True every block is written into the same buffer.
+    def iter_variates(self, name, chunk=65536, reuse=False, **params):
+        dist = self.frozen(name, **params)
+        out = dist.rvs(n=chunk)
+        while True:
+            yield out
+            out = dist.rvs(n=chunk, out=out if reuse else None)
+
+    def iter_unif(self, chunk=65536, a=0, b=1, reuse=False):
+        return self.iter_variates("unif", chunk, reuse, a=a, b=b)
+
+    def iter_disc_unif(self, chunk=65536, a=0, b=1, reuse=False):
+        return self.iter_variates("disc_unif", chunk, reuse, a=a, b=b)
+
+    def iter_triangular(self, chunk=65536, a=0, b=1, c=None, reuse=False):
+        return self.iter_variates("triangular", chunk, reuse, a=a, b=b, c=c)
+
+    def iter_expo(self, chunk=65536, lamb=1, reuse=False):
+        return self.iter_variates("expo", chunk, reuse, lamb=lamb)
+
+    def iter_weibull(self, chunk=65536, lamb=1, beta=1, reuse=False):
+        return self.iter_variates("weibull", chunk, reuse, lamb=lamb, beta=beta)
+
+    def iter_gamma(self, chunk=65536, shape=1, scale=1, reuse=False):
+        return self.iter_variates("gamma", chunk, reuse, shape=shape, scale=scale)
+
+    def iter_erlang(self, chunk=65536, m=2, lamb=1, reuse=False):
+        return self.iter_variates("erlang", chunk, reuse, m=m, lamb=lamb)
+
+    def iter_norm(self, chunk=65536, mu=0, sigma=1, reuse=False, method=None):
+        return self.iter_variates("norm", chunk, reuse, mu=mu, sigma=sigma, method=method)
+
+    def iter_chi2(self, chunk=65536, m=2, reuse=False, method=None):
+        return self.iter_variates("chi2", chunk, reuse, m=m, method=method)
+
+    def iter_lognorm(self, chunk=65536, mu=0, sigma=1, reuse=False, method=None):
+        return self.iter_variates("lognorm", chunk, reuse, mu=mu, sigma=sigma, method=method)
+
+    def iter_t_student(self, chunk=65536, m=1, reuse=False, method=None):
+        return self.iter_variates("t_student", chunk, reuse, m=m, method=method)
+
+    def iter_bern(self, chunk=65536, p=0.5, reuse=False):
+        return self.iter_variates("bern", chunk, reuse, p=p)
+
+    def iter_bino(self, chunk=65536, m=2, p=0.5, reuse=False):
+        return self.iter_variates("bino", chunk, reuse, m=m, p=p)
+
+    def iter_geom(self, chunk=65536, p=0.5, reuse=False):
+        return self.iter_variates("geom", chunk, reuse, p=p)
+
+    def iter_negbin(self, chunk=65536, m=2, p=0.5, reuse=False):
+        return self.iter_variates("negbin", chunk, reuse, m=m, p=p)
+
+    def iter_pois(self, chunk=65536, lamb=1, reuse=False):
+        return self.iter_variates("pois", chunk, reuse, lamb=lamb)
+
+    # Export: write n variates straight into a memory-mapped .npy file, chunk
+    # by chunk, with a JSON sidecar describing how they were generated.
+    def save_variates(self, path, name, n, chunk=1 << 20, **params):
+        n, chunk = int(n), int(chunk)
+        dist = self.frozen(name, **params)
+        # The sidecar is serialized before anything is written, so bad
+        # metadata fails up front instead of leaving a truncated .json.
+        metadata = {"distribution": name, "params": params, "n": n, "chunk": chunk,
+                    "dtype": np.dtype(dist.dtype).name,
+                    "seed": int(self.random_seed) if isinstance(self.random_seed, (int, np.integer)) else [int(word) for word in self.random_seed],
+                    "spawn_key": list(self.spawn_key), "norm_method": self.norm_method,
+                    "start_state": base64.b64encode(self.random.to_bytes()).decode("ascii")}
+        text = json.dumps(metadata, indent=1, default=json_scalar)
+        data = np.lib.format.open_memmap(path, mode="w+", dtype=dist.dtype, shape=(n,))
+        for start in range(0, n, chunk):
+            dist.rvs(out=data[start:start + chunk])
+        data.flush()
+        del data
+        with open(metadata_path(path), "w") as f:
+            f.write(text)
+        return json.loads(text)
+
+def json_scalar(value):
+    # NumPy scalars and arrays in save_variates params, as plain JSON values.
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def metadata_path(path):
+    return str(path) + ".json"
+
+def load_variates(path, mode="r"):
+    # (data, metadata) for a file written by save_variates. data is a memmap
+    # over the file, so nothing is read until it is indexed.
+    with open(metadata_path(path)) as f:
+        metadata = json.load(f)
+    return np.load(path, mmap_mode=mode), metadata
+
+Instrumentation.register(MersenneTwisterNP, ["extract_number", "extract_numbers", "random_raw"], "engine")
+Instrumentation.register(PDGenerator, list(DISTRIBUTIONS) + [name + "_array" for name in DISTRIBUTIONS], "generator")
+Instrumentation.register(FrozenDistribution, ["rvs"], "generator")
+Instrumentation.register(AliasSampler, ["sample"], "generator")
 
 if __name__ == '__main__':
     print("Hello World")
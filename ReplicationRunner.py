@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import PDGenerator as pdg
+import GOFTester as gof
+
+# One replication: draw n variates of `distribution` with `params` from
+# PDGenerator(seed) and run the GOFTester function named `test` on them.
+Job = namedtuple("Job", ["distribution", "params", "seed", "n", "test", "test_params"])
+
+# (label, distribution, params, test, test_params) of the GOFTester power study,
+# with every test GOFTester's own __main__ runs.
+POWER_STUDY = [
+    ("Unif(0,1)", "unif", {}, "unif_gof_test", {"k": 100}),
+    ("Unif(0,1)", "unif", {}, "correlation_test", {}),
+    ("DiscUnif(0,10)", "disc_unif", {"a": 0, "b": 10}, "disc_uniform_gof_test", {}),
+    ("DiscUnif(2,4)", "disc_unif", {"a": 2, "b": 4}, "disc_uniform_gof_test", {}),
+    ("Tria(0,1,2)", "triangular", {"a": 0, "b": 2, "c": 1}, "tria_gof_test", {"a": 0, "b": 2, "c": 1}),
+    ("Expo(1)", "expo", {"lamb": 1}, "expo_gof_test", {"lamb": 1}),
+    ("Weibull(0.8,0.9)", "weibull", {"lamb": 0.8, "beta": 0.9}, "weibull_gof_test", {"lamb": 0.8, "beta": 0.9}),
+    ("Erlang(3,1)", "erlang", {"m": 3, "lamb": 1}, "erlang_gof_test", {}),
+    ("Norm(0,1)", "norm", {"mu": 0, "sigma": 1}, "norm_gof_test", {}),
+    ("Norm(1,2)", "norm", {"mu": 1, "sigma": 2}, "norm_gof_test", {}),
+    ("Chi2(2)", "chi2", {"m": 2}, "chi2_gof_test", {}),
+    ("LogNorm(0,1)", "lognorm", {"mu": 0, "sigma": 1}, "lognorm_gof_test", {}),
+    ("t(1)", "t_student", {"m": 1}, "t_gof_test", {}),
+    ("t(2)", "t_student", {"m": 2}, "t_gof_test", {}),
+    ("Bern(0.7)", "bern", {"p": 0.7}, "bern_gof_test", {"p": 0.7}),
+    ("Bino(2, 0.7)", "bino", {"m": 2, "p": 0.7}, "bino_gof_test", {"m": 2, "p": 0.7}),
+    ("Geom(0.7)", "geom", {"p": 0.7}, "geom_gof_test", {"p": 0.7}),
+    ("Poisson(2)", "pois", {"lamb": 2}, "pois_gof_test", {"lamb": 2}),
+]
+
+# Tests that return True when they reject: correlation_test reports whether
+# the correlation is significant.
+REJECTING_TESTS = {"correlation_test"}
+
+def make_jobs(specs, seeds, n):
+    return [Job(distribution, params, seed, n, test, test_params)
+            for _, distribution, params, test, test_params in specs for seed in seeds]
+
+def job_key(job):
+    return json.dumps([job.distribution, job.params, job.seed, job.n, job.test, job.test_params], sort_keys=True)
+
+def spec_key(job):
+    return json.dumps([job.distribution, job.params, job.n, job.test, job.test_params], sort_keys=True)
+
+def run_job(job, pd_generator=None):
+    if pd_generator is None:
+        pd_generator = pdg.PDGenerator(seed=job.seed)
+    data = getattr(pd_generator, job.distribution)(n=job.n, **job.params)
+    result = bool(getattr(gof, job.test)(data, display=False, **job.test_params))
+    return not result if job.test in REJECTING_TESTS else result
+
+def run_chunk(chunk):
+    generators = pdg.PDGenerator.batch([job.seed for _, job in chunk])
+    return [(key, run_job(job, pd_generator)) for (key, job), pd_generator in zip(chunk, generators)]
+
+def complete_line(line):
+    if not line.endswith(b"\n"):
+        return False
+    if line.strip():
+        try:
+            json.loads(line)
+        except json.JSONDecodeError:
+            return False
+    return True
+
+def load_checkpoint(path):
+    # A run killed mid-write can leave a torn last line (no newline, or not
+    # valid JSON). It is dropped and cut off the file, so the next run
+    # appends from a clean line.
+    results = {}
+    if path is not None and os.path.exists(path):
+        with open(path, "rb+") as f:
+            lines = f.readlines()
+            if lines and not complete_line(lines[-1]):
+                f.truncate(f.tell() - len(lines.pop()))
+            for line in lines:
+                if line.strip():
+                    record = json.loads(line)
+                    results[record["job"]] = record["accepted"]
+    return results
+
+def record_chunk(results, chunk_results, log):
+    for key, accepted in chunk_results:
+        results[key] = accepted
+        if log is not None:
+            log.write(json.dumps({"job": key, "accepted": accepted}) + "\n")
+    if log is not None:
+        log.flush()
+
+def run_study(jobs, workers=None, chunksize=50, checkpoint=None):
+    # Returns {job_key: accepted}. Each job is seeded on its own, so results do
+    # not depend on the number of workers or the order chunks finish in.
+    # Finished chunks are appended to `checkpoint` and skipped on restart.
+    results = load_checkpoint(checkpoint)
+    pending = [(key, job) for key, job in ((job_key(job), job) for job in jobs) if key not in results]
+    chunks = [pending[i:i + chunksize] for i in range(0, len(pending), chunksize)]
+    log = open(checkpoint, "a") if checkpoint is not None else None
+    try:
+        if workers == 1:
+            for chunk in chunks:
+                record_chunk(results, run_chunk(chunk), log)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(run_chunk, chunk) for chunk in chunks]
+                for future in as_completed(futures):
+                    record_chunk(results, future.result(), log)
+    finally:
+        if log is not None:
+            log.close()
+    return results
+
+def acceptance_rates(jobs, results):
+    # {spec_key: (accepted, replications)} in the order specs first appear in jobs.
+    rates = {}
+    for job in jobs:
+        accepted, total = rates.get(spec_key(job), (0, 0))
+        rates[spec_key(job)] = (accepted + results[job_key(job)], total + 1)
+    return {key: accepted / total for key, (accepted, total) in rates.items()}
+
+def run_batch_study(specs, seeds, n):
+    # Same rates as acceptance_rates(jobs, run_study(jobs)) for
+    # make_jobs(specs, seeds, n), but each spec draws all replications into one
+    # (R, n) matrix and tests it with a single *_gof_test_batch call. The geom
+    # and pois rates can differ slightly, since those batch tests pool bins
+    # over the whole matrix rather than per row.
+    seeds = list(seeds)
+    rates = {}
+    for _, distribution, params, test, test_params in specs:
+        generators = pdg.PDGenerator.batch(seeds)
+        data = np.array([getattr(pd_generator, distribution)(n=n, **params) for pd_generator in generators])
+        key = spec_key(Job(distribution, params, None, n, test, test_params))
+        rates[key] = getattr(gof, test + "_batch")(data, **test_params).acceptance_rate
+    return rates
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="GOFTester power study on a process pool.")
+    parser.add_argument("--replications", type=int, default=1000)
+    parser.add_argument("--first-seed", type=int, default=4)
+    parser.add_argument("--n", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=50)
+    parser.add_argument("--checkpoint", default=None)
+    parser.add_argument("--batched", action="store_true", help="one batched test call per distribution, in-process")
+    args = parser.parse_args()
+
+    seeds = range(args.first_seed, args.first_seed + args.replications)
+    jobs = make_jobs(POWER_STUDY, seeds, args.n)
+    print(f"{args.replications} test with {args.n} obs")
+    print()
+    if args.batched:
+        rates = run_batch_study(POWER_STUDY, seeds, args.n)
+    else:
+        results = run_study(jobs, workers=args.workers, chunksize=args.chunksize, checkpoint=args.checkpoint)
+        rates = acceptance_rates(jobs, results)
+    for label, distribution, params, test, test_params in POWER_STUDY:
+        key = spec_key(Job(distribution, params, None, args.n, test, test_params))
+        print(f"{'Correlation Test' if test == 'correlation_test' else 'Goodness of Fit Test'} - {label}")
+        print(rates[key])
+        print()
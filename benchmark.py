@@ -0,0 +1,177 @@
+import argparse
+import csv
+import json
+import sys
+import time
+import tracemalloc
+import PDGenerator as pdg
+import GOFTester as gof
+from ReplicationRunner import POWER_STUDY
+
+# (distribution, params) timed through both the list method and its _array twin.
+GENERATOR_CASES = [
+    ("unif", {}),
+    ("disc_unif", {"a": 0, "b": 10}),
+    ("triangular", {"a": 0, "b": 2, "c": 1}),
+    ("expo", {"lamb": 1}),
+    ("weibull", {"lamb": 0.8, "beta": 0.9}),
+    ("gamma", {"shape": 0.5}),
+    ("gamma", {"shape": 3}),
+    ("erlang", {"m": 3, "lamb": 1}),
+    ("norm", {"method": "approx"}),
+    ("norm", {"method": "polar"}),
+    ("norm", {"method": "ziggurat"}),
+    ("chi2", {"m": 2}),
+    ("lognorm", {}),
+    ("t_student", {"m": 2}),
+    ("bern", {"p": 0.7}),
+    ("bino", {"m": 2, "p": 0.7}),
+    ("bino", {"m": 1000, "p": 0.3}),
+    ("geom", {"p": 0.7}),
+    ("negbin", {"m": 2, "p": 0.5}),
+    ("pois", {"lamb": 2}),
+    ("pois", {"lamb": 100}),
+]
+
+# Every test of the GOFTester power study.
+GOF_CASES = [(distribution, params, test, test_params)
+             for _, distribution, params, test, test_params in POWER_STUDY]
+
+# Small batches: per-call overhead of FrozenDistribution.rvs against the list
+# methods, timed over SMALL_CALLS calls each.
+SMALL_SIZES = [1, 10]
+SMALL_CALLS = 1000
+
+FIELDS = ["kind", "name", "params", "n", "seconds", "rate", "peak_bytes"]
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def peak_bytes(func):
+    # Measured in a separate call: tracemalloc slows allocation down too much
+    # for the timed runs. NumPy buffers are traced as well.
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def record(kind, name, params, n, seconds, peak):
+    return {"kind": kind, "name": name, "params": json.dumps(params, sort_keys=True), "n": n,
+            "seconds": seconds, "rate": n / seconds if seconds > 0 else float("inf"), "peak_bytes": peak}
+
+def bench_generators(sizes, repeat=3, seed=0):
+    results = []
+    for distribution, params in GENERATOR_CASES:
+        for name in (distribution, distribution + "_array"):
+            for n in sizes:
+                method = getattr(pdg.PDGenerator(seed=seed), name)
+                run = lambda: method(n=n, **params)
+                run()
+                results.append(record("generator", name, params, n, best_time(run, repeat), peak_bytes(run)))
+    return results
+
+def bench_small(repeat=3, seed=0):
+    results = []
+    for distribution, params in GENERATOR_CASES:
+        generator = pdg.PDGenerator(seed=seed)
+        frozen = generator.frozen(distribution, **params)
+        method = getattr(generator, distribution)
+        for name, func in ((distribution, lambda n: method(n=n, **params)), (distribution + ".rvs", frozen.rvs)):
+            for n in SMALL_SIZES:
+                run = lambda: [func(n) for _ in range(SMALL_CALLS)]
+                run()
+                results.append(record("small", name, params, n, best_time(run, repeat) / SMALL_CALLS, peak_bytes(run)))
+    return results
+
+def bench_gof(sizes, repeat=3, seed=0):
+    results = []
+    for distribution, params, test, test_params in GOF_CASES:
+        for n in sizes:
+            data = getattr(pdg.PDGenerator(seed=seed), distribution + "_array")(n=n, **params)
+            func = getattr(gof, test)
+            def run():
+                # Time the fit as well: a warm fit cache would turn the MLE
+                # tests into lookups.
+                gof.clear_fit_cache()
+                return func(data, display=False, **test_params)
+            run()
+            results.append(record("gof", test, dict(test_params, distribution=distribution, **params), n,
+                                  best_time(run, repeat), peak_bytes(run)))
+    return results
+
+def result_key(result):
+    return (result["kind"], result["name"], result["params"], result["n"])
+
+def compare(results, baseline, tolerance=0.2):
+    # Rows whose throughput fell more than `tolerance` below the baseline,
+    # as (result, baseline rate, current/baseline ratio).
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is not None:
+            ratio = result["rate"] / old["rate"]
+            if ratio < 1 - tolerance:
+                regressions.append((result, old["rate"], ratio))
+    return regressions
+
+def write_json(results, path):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=1)
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+def write_csv(results, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Throughput and memory benchmark for PDGenerator and GOFTester.")
+    parser.add_argument("--sizes", default="1000,100000", help="comma separated sample sizes")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", choices=["generator", "small", "gof"], default=None)
+    parser.add_argument("--json", default=None, help="write results as JSON")
+    parser.add_argument("--csv", default=None, help="write results as CSV")
+    parser.add_argument("--baseline", default=None, help="JSON results to compare against")
+    parser.add_argument("--save-baseline", default=None, help="write results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed drop in variates/sec")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = []
+    if args.only in (None, "generator"):
+        results += bench_generators(sizes, args.repeat, args.seed)
+    if args.only in (None, "small"):
+        results += bench_small(args.repeat, args.seed)
+    if args.only in (None, "gof"):
+        results += bench_gof(sizes, args.repeat, args.seed)
+
+    for result in results:
+        print(f"{result['kind']:9} {result['name']:22} {result['params']:48} n={result['n']:<8} "
+              f"{result['rate']:14.0f}/s {result['peak_bytes']:>12} B")
+
+    if args.json is not None:
+        write_json(results, args.json)
+    if args.csv is not None:
+        write_csv(results, args.csv)
+    if args.save_baseline is not None:
+        write_json(results, args.save_baseline)
+    if args.baseline is not None:
+        regressions = compare(results, read_json(args.baseline), args.tolerance)
+        for result, old_rate, ratio in regressions:
+            print(f"REGRESSION {result['name']} {result['params']} n={result['n']}: "
+                  f"{result['rate']:.0f}/s vs {old_rate:.0f}/s baseline ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,69 @@
+import random
+import sys
+import numpy as np
+import PDGenerator as pdg
+
+# Checks that MersenneTwisterNP produces exactly the MT19937 stream of the
+# pure-Python MersenneTwister and of NumPy's MT19937, for every way of drawing
+# from it. Exits with status 1 on the first mismatch.
+
+SEEDS = [0, 1, 3, 5489, 2**32 - 1, -7, 2**40 + 3]
+# Request sizes around the 624-word block boundaries, mixed with scalar draws.
+SIZES = [1, 5, 623, 624, 625, 1, 1247, 1248, 3000, 70000, 2, 624 * 65 + 7]
+
+def reference_words(seed, n):
+    bit_generator = np.random.MT19937()
+    bit_generator._legacy_seeding(seed & 0xFFFFFFFF)
+    return bit_generator.random_raw(n).astype(np.uint32)
+
+def check(name, actual, expected):
+    if not np.array_equal(actual, expected):
+        print(f"MISMATCH {name}")
+        sys.exit(1)
+
+def verify_seed(seed):
+    total = sum(SIZES) * 2
+    pure = pdg.MersenneTwister(seed)
+    expected = np.array([pure.extract_number() for _ in range(total)])
+    if 0 <= seed < 2**32:
+        check(f"MersenneTwister({seed}) vs np.random.MT19937", np.rint(expected * 0xFFFFFFFF).astype(np.uint32), reference_words(seed, total))
+
+    engine = pdg.MersenneTwisterNP(seed)
+    drawn = []
+    for i, n in enumerate(SIZES):
+        if n == 1:
+            drawn.append([engine.extract_number()])
+        elif i % 2:
+            drawn.append(engine.random_raw(n) / 0xFFFFFFFF)
+        else:
+            drawn.append(engine.extract_numbers(n))
+        drawn.append(engine.extract_numbers(out=np.empty(n)))
+    check(f"MersenneTwisterNP({seed}) draws", np.concatenate(drawn), expected)
+
+    # skip, and state restored mid-block, land on the same positions.
+    for k in [0, 1, 623, 624, 625, 5000]:
+        engine = pdg.MersenneTwisterNP(seed)
+        engine.extract_numbers(7)
+        engine.skip(k)
+        check(f"MersenneTwisterNP({seed}).skip({k})", engine.extract_numbers(10), expected[7 + k:17 + k])
+        restored = pdg.MersenneTwisterNP.from_bytes(engine.to_bytes())
+        check(f"MersenneTwisterNP({seed}) restored", restored.extract_numbers(10), expected[17 + k:27 + k])
+
+def verify_init_by_array():
+    for key in ([1, 2, 3], [0x123, 0x234, 0x345, 0x456], list(range(700))):
+        engine = pdg.MersenneTwisterNP()
+        engine.init_by_array(key)
+        bit_generator = random.Random()
+        bit_generator.seed(sum(word << (32 * i) for i, word in enumerate(key)))
+        if key[-1] != 0:
+            check(f"init_by_array({key[:4]}...)", engine.random_raw(2000), [bit_generator.getrandbits(32) for _ in range(2000)])
+        pure = pdg.MersenneTwister(0)
+        pure.init_by_array(key)
+        check(f"init_by_array_states({key[:4]}...)", pdg.init_by_array_states([key])[0], np.array(pure.MT, dtype=np.uint32))
+
+if __name__ == '__main__':
+    for seed in SEEDS:
+        verify_seed(seed)
+    verify_init_by_array()
+    check("init_genrand_states", pdg.init_genrand_states(SEEDS), np.array([pdg.MersenneTwister(seed).MT for seed in SEEDS], dtype=np.uint32))
+    print("OK: MersenneTwisterNP matches MersenneTwister and np.random.MT19937")